@@ -0,0 +1,67 @@
+"""Compare two load-test reports and print the relative change per operation.
+
+Usage: python -m benchmarks.compare baseline.json candidate.json [--threshold 10]
+
+Exits with status 1 when any operation's p95 latency grew, or its
+throughput dropped, by more than --threshold percent.
+"""
+import argparse
+import json
+
+METRICS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "error_rate")
+
+
+def _change(before, after):
+    if not before:
+        return None
+    return (after - before) / before * 100
+
+
+def compare(baseline, candidate):
+    rows = {}
+    sections = {"overall": (baseline.get("overall", {}), candidate.get("overall", {}))}
+    for name, stats in candidate.get("operations", {}).items():
+        sections[name] = (baseline.get("operations", {}).get(name, {}), stats)
+    for name, (before, after) in sections.items():
+        if not before or not after:
+            continue
+        rows[name] = {
+            metric: {"baseline": before[metric], "candidate": after[metric], "change_pct": _change(before[metric], after[metric])}
+            for metric in METRICS
+        }
+    return rows
+
+
+def regressions(rows, threshold):
+    found = []
+    for name, metrics in rows.items():
+        p95 = metrics["p95_ms"]["change_pct"]
+        throughput = metrics["throughput_rps"]["change_pct"]
+        if p95 is not None and p95 > threshold:
+            found.append(f"{name}: p95 +{p95:.1f}%")
+        if throughput is not None and throughput < -threshold:
+            found.append(f"{name}: throughput {throughput:.1f}%")
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10, help="Allowed regression in percent")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    rows = compare(baseline, candidate)
+    found = regressions(rows, args.threshold)
+    print(json.dumps({
+        "baseline_commit": baseline.get("commit"),
+        "candidate_commit": candidate.get("commit"),
+        "comparison": rows,
+        "regressions": found,
+    }, indent=2))
+    raise SystemExit(1 if found else 0)
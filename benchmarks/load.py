@@ -0,0 +1,275 @@
+"""Drive the running API with a concurrent request mix and report latency as JSON.
+
+Usage: python -m benchmarks.load --url http://localhost:8000 [--concurrency 32]
+       [--duration 30] [--mix read=70,deposit=10,withdraw=10,payment=10]
+       [--output report.json]
+
+Requires httpx (pip install -r benchmarks/requirements.txt). Ids are
+discovered through the list endpoints, so seed the database first with
+python -m benchmarks.seed. Before the warmup a one-day interest accrual
+runs to completion under --interest-run (a no-op once that run has
+finished) so the status read has chunks to summarise. 4xx responses such as insufficient funds count
+as "rejected"; 5xx responses and transport failures count as errors.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import subprocess
+import time
+from datetime import date
+
+import httpx
+
+DEFAULT_MIX = "read=70,deposit=10,withdraw=10,payment=10"
+
+# Read operations touch every router; each read picks one of these by weight.
+# The summaries, batch portfolios and accrual status are rarer, as in real traffic
+READ_OPERATIONS = {
+    "get_customer": 1, "list_customers": 1, "get_employee": 1, "list_employees": 1,
+    "list_accounts": 1, "list_savings": 1, "list_checking": 1,
+    "get_loan": 1, "list_loans": 1, "get_payment": 1, "list_payments": 1,
+    "get_portfolio": 1, "batch_portfolios": 0.5, "account_statement": 1,
+    "branch_summaries": 0.5, "city_summaries": 0.25, "get_branch_summary": 0.5,
+    "interest_status": 0.25,
+}
+READ_NAMES = list(READ_OPERATIONS)
+READ_WEIGHTS = [READ_OPERATIONS[name] for name in READ_NAMES]
+
+# Customers per batch portfolio request
+PORTFOLIO_BATCH = 10
+
+
+class Ids:
+    """Primary keys sampled from the API so requests hit existing rows"""
+
+    def __init__(self):
+        self.customers = []
+        self.employees = []
+        self.accounts = []
+        self.loans = []
+        self.payments = []
+        self.branches = []
+        self.interest_run = None
+
+    async def discover(self, client, sample=1000):
+        for attr, path, key in (
+            ("customers", "/customers/", "customer_id"),
+            ("employees", "/employees/", "employee_id"),
+            ("accounts", "/accounts/", "account_number"),
+            ("loans", "/loans/", "loan_number"),
+            ("payments", "/payments/", "payment_number"),
+        ):
+            response = await client.get(path, params={"limit": sample})
+            response.raise_for_status()
+            setattr(self, attr, [item[key] for item in response.json()["items"]])
+        response = await client.get("/branches/summary")
+        response.raise_for_status()
+        self.branches = [row["branch_name"] for row in response.json()]
+        if not (self.customers and self.accounts and self.loans):
+            raise SystemExit("No data to benchmark against; run python -m benchmarks.seed first")
+
+
+def _request(operation, ids, rng):
+    """(method, path, params, json body) for one operation"""
+    if operation == "get_customer":
+        return "GET", f"/customers/{rng.choice(ids.customers)}", None, None
+    if operation == "list_customers":
+        return "GET", "/customers/", {"limit": 50, "after": rng.choice(ids.customers)}, None
+    if operation == "get_employee" and ids.employees:
+        return "GET", f"/employees/{rng.choice(ids.employees)}", None, None
+    if operation == "list_employees":
+        return "GET", "/employees/", {"limit": 50}, None
+    if operation == "list_accounts":
+        return "GET", "/accounts/", {"limit": 50, "after": rng.choice(ids.accounts)}, None
+    if operation == "list_savings":
+        return "GET", "/accounts/savings", {"limit": 50}, None
+    if operation == "list_checking":
+        return "GET", "/accounts/checking", {"limit": 50}, None
+    if operation == "get_loan":
+        return "GET", f"/loans/{rng.choice(ids.loans)}", None, None
+    if operation == "list_loans":
+        return "GET", "/loans/", {"limit": 50, "after": rng.choice(ids.loans)}, None
+    if operation == "get_payment" and ids.payments:
+        return "GET", f"/payments/{rng.choice(ids.payments)}", None, None
+    if operation == "list_payments":
+        return "GET", "/payments/", {"limit": 50}, None
+    if operation == "get_portfolio":
+        return "GET", f"/customers/{rng.choice(ids.customers)}/portfolio", None, None
+    if operation == "batch_portfolios":
+        customers = rng.sample(ids.customers, min(PORTFOLIO_BATCH, len(ids.customers)))
+        return "GET", "/customers/portfolio", {"customer_id": customers}, None
+    if operation == "account_statement":
+        return "GET", f"/accounts/{rng.choice(ids.accounts)}/statement", {"limit": 50}, None
+    if operation == "branch_summaries":
+        return "GET", "/branches/summary", {"group_by": "branch"}, None
+    if operation == "city_summaries":
+        return "GET", "/branches/summary", {"group_by": "city"}, None
+    if operation == "get_branch_summary" and ids.branches:
+        return "GET", f"/branches/{rng.choice(ids.branches)}/summary", None, None
+    if operation == "interest_status" and ids.interest_run:
+        return "GET", f"/admin/interest/{ids.interest_run}", None, None
+    if operation == "deposit":
+        amount = round(rng.uniform(1, 500), 2)
+        return "POST", f"/accounts/{rng.choice(ids.accounts)}/deposit", {"amount": amount}, None
+    if operation == "withdraw":
+        amount = round(rng.uniform(1, 500), 2)
+        return "POST", f"/accounts/{rng.choice(ids.accounts)}/withdraw", {"amount": amount}, None
+    if operation == "payment":
+        body = {
+            "payment_date": date.today().isoformat(),
+            "payment_amount": str(round(rng.uniform(50, 2000), 2)),
+            "loan_number": rng.choice(ids.loans),
+            "account_number": rng.choice(ids.accounts),
+        }
+        return "POST", "/payments/", None, body
+    # Fall back to a customer read when a table had no rows to sample
+    return "GET", f"/customers/{rng.choice(ids.customers)}", None, None
+
+
+def parse_mix(text):
+    weights = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("read", "deposit", "withdraw", "payment"):
+            raise SystemExit(f"Unknown operation in --mix: {name}")
+        weights[name] = float(weight)
+    return weights
+
+
+async def _worker(client, ids, weights, deadline, rng, samples):
+    categories = list(weights)
+    category_weights = [weights[name] for name in categories]
+    while time.perf_counter() < deadline:
+        category = rng.choices(categories, category_weights)[0]
+        operation = rng.choices(READ_NAMES, READ_WEIGHTS)[0] if category == "read" else category
+        method, path, params, body = _request(operation, ids, rng)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, params=params, json=body)
+            outcome = "error" if response.status_code >= 500 else "rejected" if response.status_code >= 400 else "ok"
+        except httpx.HTTPError:
+            outcome = "error"
+        samples.append((operation, time.perf_counter() - start, outcome))
+
+
+def _percentiles(latencies):
+    ordered = sorted(latencies)
+
+    def pick(fraction):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000
+
+    return {
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+    }
+
+
+def summarise(samples, elapsed):
+    by_operation = {}
+    for operation, latency, outcome in samples:
+        by_operation.setdefault(operation, []).append((latency, outcome))
+
+    def stats(entries):
+        count = len(entries)
+        errors = sum(1 for _, outcome in entries if outcome == "error")
+        rejected = sum(1 for _, outcome in entries if outcome == "rejected")
+        return {
+            "requests": count,
+            "throughput_rps": count / elapsed,
+            "errors": errors,
+            "rejected": rejected,
+            "error_rate": errors / count,
+            **_percentiles([latency for latency, _ in entries]),
+        }
+
+    all_entries = [(latency, outcome) for _, latency, outcome in samples]
+    return {
+        "overall": stats(all_entries) if all_entries else {},
+        "operations": {name: stats(entries) for name, entries in sorted(by_operation.items())},
+    }
+
+
+async def prepare_interest_run(client, run_id):
+    """Accrue one day of interest under ``run_id`` and wait for it; re-posting a finished run does nothing"""
+    response = await client.post("/admin/interest/accrue", json={"run_id": run_id, "days": 1})
+    # 409: another benchmark already started it, so just wait
+    if response.status_code != 409:
+        response.raise_for_status()
+    while True:
+        response = await client.get(f"/admin/interest/{run_id}")
+        response.raise_for_status()
+        if not response.json()["running"]:
+            return
+        await asyncio.sleep(0.5)
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(url, concurrency, duration, warmup, mix, seed, interest_run="benchmark"):
+    weights = parse_mix(mix)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        ids = Ids()
+        await ids.discover(client)
+        await prepare_interest_run(client, interest_run)
+        ids.interest_run = interest_run
+
+        if warmup:
+            await asyncio.gather(*[
+                _worker(client, ids, weights, time.perf_counter() + warmup, random.Random(seed + i), [])
+                for i in range(concurrency)
+            ])
+
+        samples = []
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*[
+            _worker(client, ids, weights, deadline, random.Random(seed + i), samples)
+            for i in range(concurrency)
+        ])
+        elapsed = time.perf_counter() - start
+
+    return {
+        "commit": _commit(),
+        "config": {
+            "url": url, "concurrency": concurrency, "duration_s": duration,
+            "warmup_s": warmup, "mix": weights, "seed": seed, "interest_run": interest_run,
+        },
+        "elapsed_s": elapsed,
+        **summarise(samples, elapsed),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds before the run")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Relative weights of read, deposit, withdraw and payment")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--interest-run", default="benchmark", help="Accrual run id whose status the reads poll")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = json.dumps(
+        asyncio.run(run(args.url, args.concurrency, args.duration, args.warmup, args.mix, args.seed, args.interest_run)),
+        indent=2
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+    else:
+        print(report)
@@ -0,0 +1,91 @@
+"""Compare text-protocol and cached prepared statements on the point-lookup routes.
+
+Usage: python -m benchmarks.prepared_statements [--iterations 2000] [--output result.json]
+
+Runs the asyncio helpers the routes use against the database configured
+through the DB_* environment variables; tables without rows are skipped.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from db.async_database import _connect, execute_read_single_query, execute_read_query
+from db.pool import AsyncConnectionPool
+
+# The queries behind GET /customers/{id}, /employees/{id}, /loans/{id}, /payments/{id}
+POINT_LOOKUPS = {
+    "customer": ("SELECT * FROM customer WHERE customer_id = %s", "customer_id"),
+    "employee": ("SELECT * FROM employee WHERE employee_id = %s", "employee_id"),
+    "loan": ("SELECT * FROM loan WHERE loan_number = %s", "loan_number"),
+    "payment": ("SELECT * FROM payment WHERE payment_number = %s", "payment_number"),
+}
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def _sample_keys(conn, table, key, limit=1000):
+    rows = await execute_read_query(conn, f"SELECT {key} FROM {table} ORDER BY {key} LIMIT %s", (limit,))
+    return [row[key] for row in rows]
+
+async def _time_lookups(pool, query, keys, iterations):
+    conn = await pool.acquire()
+    try:
+        # Warm up so the prepared run does not pay for PREPARE inside the measurement
+        await execute_read_single_query(conn, query, (keys[0],))
+        samples = []
+        for i in range(iterations):
+            start = time.perf_counter()
+            await execute_read_single_query(conn, query, (keys[i % len(keys)],))
+            samples.append((time.perf_counter() - start) * 1000)
+        return samples
+    finally:
+        await conn.close()
+
+def _summary(samples):
+    return {
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": _percentile(samples, 0.50),
+        "p95_ms": _percentile(samples, 0.95),
+        "p99_ms": _percentile(samples, 0.99),
+    }
+
+async def run(iterations):
+    text_pool = AsyncConnectionPool(_connect, size=1, max_overflow=0, statement_cache_size=0)
+    prepared_pool = AsyncConnectionPool(_connect, size=1, max_overflow=0, statement_cache_size=64)
+    results = {}
+    try:
+        for table, (query, key) in POINT_LOOKUPS.items():
+            conn = await text_pool.acquire()
+            try:
+                keys = await _sample_keys(conn, table, key)
+            finally:
+                await conn.close()
+            if not keys:
+                print(f"Skipping {table}: no rows")
+                continue
+            text = _summary(await _time_lookups(text_pool, query, keys, iterations))
+            prepared = _summary(await _time_lookups(prepared_pool, query, keys, iterations))
+            results[table] = {
+                "text": text,
+                "prepared": prepared,
+                "p50_speedup": text["p50_ms"] / prepared["p50_ms"] if prepared["p50_ms"] else None,
+            }
+    finally:
+        await text_pool.dispose()
+        await prepared_pool.dispose()
+    return {"iterations": iterations, "lookups": results}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = json.dumps(asyncio.run(run(args.iterations)), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+    else:
+        print(report)
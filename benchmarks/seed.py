@@ -0,0 +1,176 @@
+"""Seed the benchmark database with synthetic customers, accounts, loans and payments.
+
+Usage: python -m benchmarks.seed [--customers 10000] [--accounts 20000] ... [--reset]
+
+Creates the banking_system database and schema through db.init if needed,
+then bulk-loads rows with multi-row INSERTs in chunks. Ids continue after
+whatever is already in each table unless --reset empties the tables first.
+"""
+import argparse
+import json
+import random
+import time
+from datetime import date, timedelta
+from db.database import DB_HOST, DB_USER, DB_PASSWORD
+from db.init import initialize_database
+from db.loan_balance import rebuild as rebuild_loan_balances
+from db.branch_summary import rebuild as rebuild_branch_summaries
+
+CHUNK_SIZE = 5000
+
+# Child tables first so TRUNCATE never trips a foreign key
+TABLES = [
+    "branch_loan_summary", "loan_balance", "loan_payment", "payment", "borrower", "loan_branch", "loan", "depositor",
+    "checking_account", "savings_account", "account", "cust_banker", "works_for",
+    "employee", "customer", "branch", "id_sequence", "transaction", "balance_checkpoint",
+    "interest_accrual", "idempotency_key",
+]
+
+CITIES = ["New York", "Chicago", "Boston", "Seattle", "Austin", "Denver", "Miami", "Portland"]
+STREETS = ["Main St", "Oak Ave", "Pine Rd", "Maple Dr", "Cedar Ln", "Elm St"]
+
+
+def _insert(cursor, query, rows):
+    for i in range(0, len(rows), CHUNK_SIZE):
+        cursor.executemany(query, rows[i:i + CHUNK_SIZE])
+
+
+def _next_id(cursor, table, column, start):
+    cursor.execute(f"SELECT MAX({column}) FROM {table}")
+    (current,) = cursor.fetchone()
+    return start if current is None else current + 1
+
+
+def _reset(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        for table in TABLES:
+            cursor.execute(f"TRUNCATE TABLE `{table}`")
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+        connection.commit()
+    finally:
+        cursor.close()
+
+
+def seed(connection, customers, employees, branches, accounts, loans, payments, rng):
+    """Load the requested volumes and return the id ranges that were created"""
+    cursor = connection.cursor()
+    try:
+        first_customer = _next_id(cursor, "customer", "customer_id", 1)
+        first_employee = _next_id(cursor, "employee", "employee_id", 101)
+        first_account = _next_id(cursor, "account", "account_number", 1001)
+        first_loan = _next_id(cursor, "loan", "loan_number", 5001)
+        first_payment = _next_id(cursor, "payment", "payment_number", 7001)
+
+        customer_ids = list(range(first_customer, first_customer + customers))
+        _insert(cursor, """
+            INSERT INTO customer (customer_id, customer_name, customer_street, customer_city)
+            VALUES (%s, %s, %s, %s)
+        """, [
+            (customer_id, f"Customer {customer_id}", f"{rng.randint(1, 999)} {rng.choice(STREETS)}", rng.choice(CITIES))
+            for customer_id in customer_ids
+        ])
+
+        _insert(cursor, """
+            INSERT INTO employee (employee_id, employee_name, telephone_number, dependent_name, start_date, employment_length)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, [
+            (employee_id, f"Employee {employee_id}", f"555-{employee_id % 10000:04d}", None,
+             date(2015, 1, 1) + timedelta(days=rng.randint(0, 3000)), rng.randint(0, 10))
+            for employee_id in range(first_employee, first_employee + employees)
+        ])
+
+        branch_names = [f"Branch {i}" for i in range(branches)]
+        _insert(cursor, """
+            INSERT IGNORE INTO branch (branch_name, branch_city, assets) VALUES (%s, %s, %s)
+        """, [(name, rng.choice(CITIES), rng.randint(1_000_000, 50_000_000)) for name in branch_names])
+
+        # Accounts alternate between savings and checking, each linked to a random customer
+        account_ids = list(range(first_account, first_account + accounts))
+        _insert(cursor, "INSERT INTO account (account_number, balance) VALUES (%s, %s)", [
+            (account_number, round(rng.uniform(0, 20000), 2)) for account_number in account_ids
+        ])
+        _insert(cursor, "INSERT INTO savings_account (account_number, interest_rate) VALUES (%s, %s)", [
+            (account_number, round(rng.uniform(0.5, 5), 2)) for account_number in account_ids[::2]
+        ])
+        _insert(cursor, "INSERT INTO checking_account (account_number, overdraft_amount) VALUES (%s, %s)", [
+            (account_number, rng.choice([0, 250, 500, 1000])) for account_number in account_ids[1::2]
+        ])
+        # Start each seeded account's balance history
+        cursor.execute("""
+            INSERT INTO balance_checkpoint (account_number, transaction_id, as_of, balance)
+            SELECT account_number, 0, NOW(6), balance FROM account WHERE account_number >= %s
+        """, (first_account,))
+        if customer_ids:
+            _insert(cursor, """
+                INSERT INTO depositor (customer_id, account_number, access_date) VALUES (%s, %s, CURDATE())
+            """, [(rng.choice(customer_ids), account_number) for account_number in account_ids])
+
+        loan_ids = list(range(first_loan, first_loan + loans))
+        _insert(cursor, "INSERT INTO loan (loan_number, amount) VALUES (%s, %s)", [
+            (loan_number, rng.randint(1000, 250000)) for loan_number in loan_ids
+        ])
+        if branch_names:
+            _insert(cursor, "INSERT INTO loan_branch (branch_name, loan_number) VALUES (%s, %s)", [
+                (rng.choice(branch_names), loan_number) for loan_number in loan_ids
+            ])
+        if customer_ids:
+            _insert(cursor, "INSERT INTO borrower (customer_id, loan_number) VALUES (%s, %s)", [
+                (rng.choice(customer_ids), loan_number) for loan_number in loan_ids
+            ])
+
+        payment_ids = list(range(first_payment, first_payment + payments)) if loan_ids and account_ids else []
+        _insert(cursor, "INSERT INTO payment (payment_number, payment_date, payment_amount) VALUES (%s, %s, %s)", [
+            (payment_number, date(2020, 1, 1) + timedelta(days=rng.randint(0, 1800)), round(rng.uniform(50, 2000), 2))
+            for payment_number in payment_ids
+        ])
+        _insert(cursor, "INSERT INTO loan_payment (loan_number, account_number, payment_number) VALUES (%s, %s, %s)", [
+            (rng.choice(loan_ids), rng.choice(account_ids), payment_number) for payment_number in payment_ids
+        ])
+
+        # Totals for the seeded loans and payments
+        rebuild_loan_balances(connection)
+        rebuild_branch_summaries(connection)
+
+        # Let the id allocator continue after the seeded rows
+        cursor.execute("DELETE FROM id_sequence")
+        connection.commit()
+    finally:
+        cursor.close()
+
+    return {
+        "customers": [first_customer, first_customer + customers - 1],
+        "employees": [first_employee, first_employee + employees - 1],
+        "accounts": [first_account, first_account + accounts - 1],
+        "loans": [first_loan, first_loan + loans - 1],
+        "payments": [first_payment, first_payment + len(payment_ids) - 1],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=10000)
+    parser.add_argument("--employees", type=int, default=200)
+    parser.add_argument("--branches", type=int, default=20)
+    parser.add_argument("--accounts", type=int, default=20000)
+    parser.add_argument("--loans", type=int, default=5000)
+    parser.add_argument("--payments", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for reproducible data")
+    parser.add_argument("--reset", action="store_true", help="Empty every table before loading")
+    args = parser.parse_args()
+
+    db_connection = initialize_database(DB_HOST, DB_USER, DB_PASSWORD)
+    if db_connection is None:
+        raise SystemExit(1)
+    try:
+        if args.reset:
+            _reset(db_connection)
+        start = time.perf_counter()
+        ranges = seed(
+            db_connection, args.customers, args.employees, args.branches,
+            args.accounts, args.loans, args.payments, random.Random(args.seed)
+        )
+        print(json.dumps({"seconds": round(time.perf_counter() - start, 2), "ids": ranges}, indent=2))
+    finally:
+        db_connection.close()
@@ -0,0 +1,84 @@
+"""Time a cold ``import main`` and fail when it exceeds a budget.
+
+Usage: python -m benchmarks.startup [--runs 5] [--budget-ms 1500] [--top 15]
+       [--output report.json]
+
+Each run imports the app in a fresh interpreter with -X importtime, so no
+database is needed: the pools connect lazily on first checkout. The report
+lists the slowest imports by cumulative time to show what a regression
+pulled in. Exits with status 1 when the median wall time is over budget.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import_once():
+    """(wall seconds, {module: cumulative microseconds}) for one cold import"""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise SystemExit(f"import main failed:\n{result.stderr}")
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:  self [us] | cumulative | module", indented by nesting depth
+        _, total, name = line.split("|", 2)
+        cumulative[name.strip()] = int(total)
+    return elapsed, cumulative
+
+
+def run(runs, top):
+    timings = []
+    imports = {}
+    for _ in range(runs):
+        elapsed, cumulative = _import_once()
+        timings.append(elapsed)
+        for name, micros in cumulative.items():
+            imports.setdefault(name, []).append(micros)
+
+    slowest = sorted(
+        ((name, statistics.median(values) / 1000) for name, values in imports.items()),
+        key=lambda item: item[1], reverse=True
+    )[:top]
+    return {
+        "runs": runs,
+        "median_ms": statistics.median(timings) * 1000,
+        "min_ms": min(timings) * 1000,
+        "max_ms": max(timings) * 1000,
+        "modules": len(imports),
+        "slowest_imports_ms": dict(slowest),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500, help="Maximum median wall time of import main")
+    parser.add_argument("--top", type=int, default=15, help="How many of the slowest imports to report")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = run(args.runs, args.top)
+    report["budget_ms"] = args.budget_ms
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    if report["median_ms"] > args.budget_ms:
+        print(f"import main took {report['median_ms']:.0f} ms, over the {args.budget_ms:.0f} ms budget", file=sys.stderr)
+        raise SystemExit(1)
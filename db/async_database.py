@@ -0,0 +1,357 @@
+import time
+from contextlib import asynccontextmanager
+from functools import partial
+from mysql.connector import Error
+from metrics import observe_query
+from db import diagnostics
+from db.diagnostics import explain_query
+from mysql.connector.aio import connect
+from fastapi import HTTPException
+from db.pool import AsyncConnectionPool, PoolTimeout
+from db.replicas import ReplicaSet, record_write, prefer_primary, routed
+from db.database import (
+    DB_HOST, DB_USER, DB_PASSWORD, DB_NAME,
+    DB_POOL_SIZE, DB_POOL_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING,
+    DB_STATEMENT_CACHE_SIZE, DB_REPLICA_HOSTS, DB_REPLICA_STICKY_SECONDS, DB_REPLICA_RETRY_SECONDS,
+    DB_REPLICA_POOL_TIMEOUT
+)
+
+async def _connect(host=DB_HOST):
+    """Open a new asyncio connection for the pool"""
+    return await connect(host=host, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
+
+def create_pool(connect, timeout=DB_POOL_TIMEOUT):
+    """A pool for ``connect`` using the DB_POOL_* and statement cache settings"""
+    return AsyncConnectionPool(
+        connect,
+        size=DB_POOL_SIZE,
+        max_overflow=DB_POOL_MAX_OVERFLOW,
+        timeout=timeout,
+        recycle=DB_POOL_RECYCLE,
+        pre_ping=DB_POOL_PRE_PING,
+        statement_cache_size=DB_STATEMENT_CACHE_SIZE
+    )
+
+pool = create_pool(_connect)
+# A saturated replica gives up quickly so the read falls back instead of stalling
+replicas = ReplicaSet(
+    [create_pool(partial(_connect, host), timeout=DB_REPLICA_POOL_TIMEOUT) for host in DB_REPLICA_HOSTS],
+    retry_after=DB_REPLICA_RETRY_SECONDS
+)
+
+async def get_db_connection():
+    """Borrow a connection from the asyncio pool; ``await close()`` hands it back"""
+    try:
+        return await pool.acquire()
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@asynccontextmanager
+async def borrow_connection():
+    """Borrow a pooled connection for a block outside of request dependencies"""
+    conn = await get_db_connection()
+    try:
+        yield conn
+    finally:
+        await conn.close()
+
+async def get_db():
+    """FastAPI dependency lending a pooled asyncio connection for the duration of a request"""
+    conn = await get_db_connection()
+    try:
+        yield conn
+    finally:
+        await conn.close()
+
+def in_unit_of_work(connection):
+    """Whether the connection is inside a transaction() block"""
+    return getattr(connection, "unit_of_work", False)
+
+@asynccontextmanager
+async def transaction(connection):
+    """Group several writes into a single commit, rolling back if any of them fails"""
+    if in_unit_of_work(connection):
+        # Nested blocks join the outer unit of work
+        yield connection
+        return
+    connection.unit_of_work = True
+    try:
+        yield connection
+        await connection.commit()
+    except BaseException:
+        await connection.rollback()
+        raise
+    finally:
+        connection.unit_of_work = False
+
+async def _open_cursor(connection, query, dictionary=False):
+    """Return (query, cursor, prepared): a cached prepared cursor when the connection has a statement cache.
+
+    The driver only skips re-preparing when it is handed the very string
+    object it prepared, so the cached SQL object is returned for the caller
+    to execute; SQL built per call still hits the cache after its first use.
+    """
+    statements = getattr(connection, "statement_cache", None)
+    if statements is None:
+        return query, await connection.cursor(dictionary=dictionary), False
+    entry = statements.get(query)
+    if entry is None:
+        entry = (query, await connection.cursor(prepared=True))
+        for _, evicted in statements.put(query, entry):
+            await evicted.close()
+    query, cursor = entry
+    return query, cursor, True
+
+async def _close_cursor(connection, query, cursor, prepared, failed=False):
+    """Close a plain cursor; keep a prepared one cached unless its statement failed"""
+    if prepared and not failed:
+        return
+    if prepared:
+        connection.statement_cache.discard(query)
+    await cursor.close()
+
+def _as_dicts(cursor, rows):
+    """Prepared cursors return tuples; shape them like dictionary cursor rows"""
+    columns = cursor.column_names
+    return [dict(zip(columns, row)) for row in rows]
+
+async def _explain(connection, query, params):
+    """EXPLAIN plan rows for a slow statement, or None if it cannot be explained"""
+    statement = explain_query(query)
+    if statement is None:
+        return None
+    cursor = await connection.cursor(dictionary=True)
+    try:
+        await cursor.execute(statement, params)
+        return await cursor.fetchall()
+    except Error:
+        return None
+    finally:
+        await cursor.close()
+
+async def _observe(connection, query, params, elapsed, rows):
+    """Report a finished statement to metrics and, when enabled, to the diagnostics log"""
+    observe_query(query, elapsed, rows)
+    if diagnostics.enabled and diagnostics.record(query, elapsed):
+        diagnostics.log_slow(query, params, elapsed, await _explain(connection, query, params))
+
+async def _replica_connection(connection):
+    """A pooled replica connection for a read, or None when the read must stay on ``connection``"""
+    if not replicas or in_unit_of_work(connection):
+        return None
+    if getattr(connection, "pool", pool) is not pool:
+        # Shard connections have no replicas of their own
+        return None
+    if prefer_primary(DB_REPLICA_STICKY_SECONDS):
+        routed["sticky"] += 1
+        return None
+    for replica_pool in replicas.candidates():
+        try:
+            replica = await replica_pool.acquire()
+        except PoolTimeout:
+            continue
+        except Error:
+            replicas.mark_down(replica_pool)
+            continue
+        routed["replica"] += 1
+        return replica
+    # Every replica is down or saturated
+    routed["primary"] += 1
+    return None
+
+async def execute_read_query(connection, query, params=None):
+    """Execute a SELECT query returning multiple rows, on a replica when one can serve it"""
+    replica = await _replica_connection(connection)
+    if replica is None:
+        return await _fetch_all(connection, query, params)
+    try:
+        return await _fetch_all(replica, query, params)
+    finally:
+        await replica.close()
+
+async def execute_read_single_query(connection, query, params=None):
+    """Execute a SELECT query returning a single row, on a replica when one can serve it"""
+    replica = await _replica_connection(connection)
+    if replica is None:
+        return await _fetch_one(connection, query, params)
+    try:
+        return await _fetch_one(replica, query, params)
+    finally:
+        await replica.close()
+
+async def execute_primary_read_single_query(connection, query, params=None):
+    """Execute a SELECT query returning a single row on ``connection`` itself, for reads that get cached"""
+    # A lagging replica's row would be served from the cache for the whole TTL
+    return await _fetch_one(connection, query, params)
+
+async def _fetch_all(connection, query, params=None):
+    """Run a SELECT on ``connection`` and return every row"""
+    query, cursor, prepared = await _open_cursor(connection, query, dictionary=True)
+    failed = False
+    start = time.perf_counter()
+    try:
+        if params:
+            await cursor.execute(query, params)
+        else:
+            await cursor.execute(query)
+        result = await cursor.fetchall()
+        await _observe(connection, query, params, time.perf_counter() - start, len(result))
+        return _as_dicts(cursor, result) if prepared else result
+    except Error as e:
+        failed = True
+        observe_query(query, time.perf_counter() - start, failed=True)
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        await _close_cursor(connection, query, cursor, prepared, failed)
+
+async def _fetch_one(connection, query, params=None):
+    """Run a SELECT on ``connection`` and return its first row"""
+    query, cursor, prepared = await _open_cursor(connection, query, dictionary=True)
+    failed = False
+    start = time.perf_counter()
+    try:
+        if params:
+            await cursor.execute(query, params)
+        else:
+            await cursor.execute(query)
+        if prepared:
+            # Drain the result so the cached cursor can be re-executed
+            rows = _as_dicts(cursor, await cursor.fetchall())
+            await _observe(connection, query, params, time.perf_counter() - start, len(rows))
+            return rows[0] if rows else None
+        result = await cursor.fetchone()
+        await _observe(connection, query, params, time.perf_counter() - start, 1 if result else 0)
+        return result
+    except Error as e:
+        failed = True
+        observe_query(query, time.perf_counter() - start, failed=True)
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        await _close_cursor(connection, query, cursor, prepared, failed)
+
+async def execute_write_query(connection, query, params=None):
+    """Execute an INSERT, UPDATE, or DELETE query"""
+    query, cursor, prepared = await _open_cursor(connection, query)
+    failed = False
+    start = time.perf_counter()
+    try:
+        if params:
+            await cursor.execute(query, params)
+        else:
+            await cursor.execute(query)
+        if not in_unit_of_work(connection):
+            await connection.commit()
+        await _observe(connection, query, params, time.perf_counter() - start, cursor.rowcount)
+        record_write()
+        return cursor.lastrowid
+    except Error as e:
+        failed = True
+        observe_query(query, time.perf_counter() - start, failed=True)
+        if not in_unit_of_work(connection):
+            await connection.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        await _close_cursor(connection, query, cursor, prepared, failed)
+
+async def execute_many_query(connection, query, seq_params):
+    """Execute an INSERT for many parameter sets; mysql-connector folds it into a multi-row INSERT"""
+    seq_params = list(seq_params)
+    # Nothing to run; executemany would leave rowcount at -1
+    if not seq_params:
+        return 0
+    # A plain cursor: the prepared one runs executemany as one statement per row
+    cursor = await connection.cursor()
+    start = time.perf_counter()
+    try:
+        await cursor.executemany(query, seq_params)
+        if not in_unit_of_work(connection):
+            await connection.commit()
+        # The first parameter set stands in for the batch in the slow-query log and EXPLAIN
+        await _observe(connection, query, seq_params[0], time.perf_counter() - start, cursor.rowcount)
+        record_write()
+        return cursor.rowcount
+    except Error as e:
+        observe_query(query, time.perf_counter() - start, failed=True)
+        if not in_unit_of_work(connection):
+            await connection.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        await cursor.close()
+
+async def execute_update_query(connection, query, params=None):
+    """Execute an UPDATE or DELETE query and return the number of affected rows"""
+    query, cursor, prepared = await _open_cursor(connection, query)
+    failed = False
+    start = time.perf_counter()
+    try:
+        if params:
+            await cursor.execute(query, params)
+        else:
+            await cursor.execute(query)
+        if not in_unit_of_work(connection):
+            await connection.commit()
+        await _observe(connection, query, params, time.perf_counter() - start, cursor.rowcount)
+        record_write()
+        return cursor.rowcount
+    except Error as e:
+        failed = True
+        observe_query(query, time.perf_counter() - start, failed=True)
+        if not in_unit_of_work(connection):
+            await connection.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        await _close_cursor(connection, query, cursor, prepared, failed)
+
+async def _stream_batches(query, params, batch_size, source):
+    if source is not None:
+        conn = await source.acquire()
+    else:
+        conn = await _replica_connection(None)
+        if conn is None:
+            conn = await get_db_connection()
+    try:
+        cursor = await conn.cursor(dictionary=True)
+        start = time.perf_counter()
+        total = 0
+        failed = False
+        try:
+            try:
+                if params:
+                    await cursor.execute(query, params)
+                else:
+                    await cursor.execute(query)
+            except Error as e:
+                failed = True
+                raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+            # stream_query stops here; the rest runs as the response body is sent
+            yield None
+            while True:
+                rows = await cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                total += len(rows)
+                yield cursor.column_names, rows
+        finally:
+            observe_query(query, time.perf_counter() - start, total, failed=failed)
+            await cursor.close()
+    finally:
+        await conn.close()
+
+async def stream_query(query, params=None, batch_size=1000, source=None):
+    """Run a SELECT over an unbuffered cursor and return an async iterator of its row batches.
+
+    The connection is borrowed and the query executed before this returns,
+    so a failure is reported before any response has started; the iterator
+    keeps the connection until it is exhausted or closed, so the stream can
+    outlive the request handler that started it. Rows are pulled from the
+    server as they are consumed, keeping memory constant regardless of
+    result size. Exports read from a replica when one is healthy and the
+    client has not just written, or from ``source`` (e.g. a shard's pool)
+    when one is given.
+    """
+    batches = _stream_batches(query, params, batch_size, source)
+    # Once started, a dropped iterator is closed by the event loop, returning its connection
+    await batches.__anext__()
+    return batches
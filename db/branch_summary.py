@@ -0,0 +1,75 @@
+"""Per-branch loan book totals kept in ``branch_loan_summary``.
+
+create_loan adds each loan to its branch's row and payments move the
+branch's paid and outstanding amounts in the same transaction, so the
+branch dashboard reads one row per branch instead of grouping every loan.
+City totals add up the rows of the city's branches.
+
+Usage: python -m db.branch_summary   (recompute from loan_branch and loan_balance)
+"""
+from collections import defaultdict
+from db.async_database import execute_read_query, execute_write_query, execute_many_query
+
+async def add_loan(connection, branch_name, amount):
+    """Count a loan just linked to ``branch_name`` on ``connection``"""
+    query = """
+    INSERT INTO branch_loan_summary (branch_name, loan_count, loan_total, total_paid, outstanding)
+    VALUES (%s, 1, %s, 0, %s)
+    ON DUPLICATE KEY UPDATE loan_count = loan_count + 1, loan_total = loan_total + %s, outstanding = outstanding + %s
+    """
+    await execute_write_query(connection, query, (branch_name, amount, amount, amount, amount))
+
+async def apply_payments(connection, paid_by_loan):
+    """Move ``{loan_number: amount}`` from outstanding to paid on the loans' branches"""
+    if not paid_by_loan:
+        return
+    links_query = f"""
+    SELECT branch_name, loan_number FROM loan_branch
+    WHERE loan_number IN ({', '.join(['%s'] * len(paid_by_loan))})
+    """
+    links = await execute_read_query(connection, links_query, tuple(paid_by_loan))
+
+    paid_by_branch = defaultdict(int)
+    for link in links:
+        paid_by_branch[link["branch_name"]] += paid_by_loan[link["loan_number"]]
+
+    query = """
+    UPDATE branch_loan_summary SET total_paid = total_paid + %s, outstanding = outstanding - %s
+    WHERE branch_name = %s
+    """
+    # Sorted so concurrent payments lock branch rows in the same order
+    await execute_many_query(connection, query, [
+        (amount, amount, branch_name) for branch_name, amount in sorted(paid_by_branch.items())
+    ])
+
+def rebuild(connection):
+    """Recompute every branch's totals from loan_branch and loan_balance; returns the number of branches"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+        REPLACE INTO branch_loan_summary (branch_name, loan_count, loan_total, total_paid, outstanding)
+        SELECT br.branch_name, COUNT(lb.loan_number), COALESCE(SUM(b.principal), 0),
+               COALESCE(SUM(b.total_paid), 0), COALESCE(SUM(b.outstanding), 0)
+        FROM branch br
+        LEFT JOIN loan_branch lb ON lb.branch_name = br.branch_name
+        LEFT JOIN loan_balance b ON b.loan_number = lb.loan_number
+        GROUP BY br.branch_name
+        """)
+        connection.commit()
+        cursor.execute("SELECT COUNT(*) FROM branch_loan_summary")
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+
+if __name__ == "__main__":
+    import json
+    from db.connection import create_db_connection
+    from db.database import DB_HOST, DB_USER, DB_PASSWORD, DB_NAME
+
+    db_connection = create_db_connection(DB_HOST, DB_USER, DB_PASSWORD, DB_NAME)
+    if db_connection is None:
+        raise SystemExit(1)
+    try:
+        print(json.dumps({"branches": rebuild(db_connection)}, indent=2))
+    finally:
+        db_connection.close()
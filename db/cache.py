@@ -0,0 +1,137 @@
+import json
+import os
+import time
+from collections import OrderedDict
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")
+CACHE_TTL = float(os.environ.get("CACHE_TTL", "30"))
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "10000"))
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+
+class MemoryBackend:
+    """In-process LRU with a per-entry TTL and a bound on the number of entries"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key):
+        self._entries.pop(key, None)
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class RedisBackend:
+    """Shared cache across workers; requires the optional ``redis`` package"""
+
+    def __init__(self, url=CACHE_REDIS_URL, ttl=CACHE_TTL, prefix="banking:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package")
+        self._client = redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key):
+        raw = await self._client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key, value):
+        await self._client.set(self.prefix + key, json.dumps(value, default=str), ex=max(1, int(self.ttl)))
+
+    async def delete(self, key):
+        await self._client.delete(self.prefix + key)
+
+    def stats(self):
+        return {"backend": "redis"}
+
+
+class NullBackend:
+    """Disables caching while keeping the call sites unchanged"""
+
+    async def get(self, key):
+        return None
+
+    async def set(self, key, value):
+        pass
+
+    async def delete(self, key):
+        pass
+
+    def stats(self):
+        return {"backend": "none"}
+
+
+class EntityCache:
+    """Read-through cache for single rows keyed by entity name and primary key"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_load(self, entity, key, loader):
+        """Return the cached row, calling ``loader`` (a coroutine function) on a miss"""
+        cache_key = f"{entity}:{key}"
+        value = await self.backend.get(cache_key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = await loader()
+        # Misses are not cached so a later create is visible immediately
+        if value is not None:
+            await self.backend.set(cache_key, value)
+        return value
+
+    async def put(self, entity, key, value):
+        """Prime the cache with a row that was just written"""
+        await self.backend.set(f"{entity}:{key}", value)
+
+    async def invalidate(self, entity, key):
+        await self.backend.delete(f"{entity}:{key}")
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, **self.backend.stats()}
+
+
+def _create_backend(name):
+    if name == "redis":
+        return RedisBackend()
+    if name == "none":
+        return NullBackend()
+    return MemoryBackend()
+
+
+cache = EntityCache(_create_backend(CACHE_BACKEND))
@@ -1,6 +1,8 @@
-from mysql.connector import Error
-from db.init import create_db_connection
-from fastapi import HTTPException
+"""Database settings read from the environment.
+
+The API talks to MySQL through db.async_database; the maintenance scripts
+open plain connections with db.connection using these same settings.
+"""
 import os
 
 # Get database credentials (you may also import these from config.py if available)
@@ -9,52 +11,28 @@ DB_USER = os.environ.get("DB_USER", "root")
 DB_PASSWORD = os.environ.get("DB_PASSWORD", "your_new_password")
 DB_NAME = os.environ.get("DB_NAME", "banking_system")
 
-def get_db_connection():
-    """Establish a database connection using configuration parameters"""
-    return create_db_connection(DB_HOST, DB_USER, DB_PASSWORD, DB_NAME)
+# Connection pool settings
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_POOL_MAX_OVERFLOW = int(os.environ.get("DB_POOL_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "3600"))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") not in ("0", "false", "False")
 
-def execute_read_query(connection, query, params=None):
-    """Execute a SELECT query returning multiple rows"""
-    cursor = connection.cursor(dictionary=True)
-    try:
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
-        result = cursor.fetchall()
-        return result
-    except Error as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        cursor.close()
+# Prepared statements cached per pooled connection (0 sends plain text queries)
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", "64"))
 
-def execute_read_single_query(connection, query, params=None):
-    """Execute a SELECT query returning a single row"""
-    cursor = connection.cursor(dictionary=True)
-    try:
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
-        result = cursor.fetchone()
-        return result
-    except Error as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        cursor.close()
+# Read replicas: comma-separated hosts sharing the user, password and database name above
+DB_REPLICA_HOSTS = [host.strip() for host in os.environ.get("DB_REPLICA_HOSTS", "").split(",") if host.strip()]
+# Seconds a client's reads stay on the primary after it writes
+DB_REPLICA_STICKY_SECONDS = float(os.environ.get("DB_REPLICA_STICKY_SECONDS", "2"))
+# Seconds a replica that failed a checkout is left out of rotation
+DB_REPLICA_RETRY_SECONDS = float(os.environ.get("DB_REPLICA_RETRY_SECONDS", "5"))
+# Seconds a read waits for a busy replica's pool before trying the next replica or the primary
+DB_REPLICA_POOL_TIMEOUT = float(os.environ.get("DB_REPLICA_POOL_TIMEOUT", "0.05"))
 
-def execute_write_query(connection, query, params=None):
-    """Execute an INSERT, UPDATE, or DELETE query"""
-    cursor = connection.cursor()
-    try:
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
-        connection.commit()
-        return cursor.lastrowid
-    except Error as e:
-        connection.rollback()
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        cursor.close()
\ No newline at end of file
+# Extra account shards as comma-separated host[:port][/database] entries; shard 0 is the database above
+DB_SHARD_HOSTS = [shard.strip() for shard in os.environ.get("DB_SHARD_HOSTS", "").split(",") if shard.strip()]
+# How account_number maps to a shard: "range" (account_shard directory) or "hash" (modulo shard count)
+DB_SHARD_STRATEGY = os.environ.get("DB_SHARD_STRATEGY", "range")
+# Seconds each worker caches the range directory
+DB_SHARD_MAP_TTL = float(os.environ.get("DB_SHARD_MAP_TTL", "5"))
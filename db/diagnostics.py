@@ -0,0 +1,88 @@
+"""Opt-in slow-query log and per-request redundant-query detector.
+
+Enable with DB_DIAGNOSTICS=1. Statements slower than DB_SLOW_QUERY_MS are
+logged with their parameters and EXPLAIN plan; requests issuing more than
+DB_DIAGNOSTICS_MAX_QUERIES statements, or the same statement shape at least
+DB_DIAGNOSTICS_REPEAT_THRESHOLD times, are flagged when they finish.
+"""
+import logging
+import os
+import re
+from collections import Counter
+from contextvars import ContextVar
+from functools import lru_cache
+
+DB_DIAGNOSTICS = os.environ.get("DB_DIAGNOSTICS", "0") not in ("0", "false", "False")
+DB_SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", "100"))
+DB_DIAGNOSTICS_MAX_QUERIES = int(os.environ.get("DB_DIAGNOSTICS_MAX_QUERIES", "20"))
+DB_DIAGNOSTICS_REPEAT_THRESHOLD = int(os.environ.get("DB_DIAGNOSTICS_REPEAT_THRESHOLD", "3"))
+
+logger = logging.getLogger("banking.diagnostics")
+
+enabled = DB_DIAGNOSTICS
+
+# Statement shapes seen by the current request; None outside a request
+_request_shapes = ContextVar("request_shapes", default=None)
+
+_WHITESPACE = re.compile(r"\s+")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+_EXPLAINABLE = ("select", "insert", "update", "delete", "replace")
+
+
+@lru_cache(maxsize=1024)
+def statement_shape(query):
+    """Normalise SQL so repeats compare equal, e.g. IN (%s, %s, %s) becomes IN (...)"""
+    return _PLACEHOLDER_LIST.sub("(...)", _WHITESPACE.sub(" ", query).strip())
+
+
+def record(query, elapsed):
+    """Count the statement against the current request; returns True if it was slow"""
+    shapes = _request_shapes.get()
+    if shapes is not None:
+        shapes[statement_shape(query)] += 1
+    return elapsed * 1000 >= DB_SLOW_QUERY_MS
+
+
+def explain_query(query):
+    """The EXPLAIN statement for ``query``, or None for statements EXPLAIN does not accept"""
+    stripped = query.lstrip()
+    if not stripped or stripped.split(None, 1)[0].lower() not in _EXPLAINABLE:
+        return None
+    return "EXPLAIN " + stripped
+
+
+def log_slow(query, params, elapsed, plan):
+    logger.warning(
+        "Slow query (%.1f ms): %s params=%r plan=%r",
+        elapsed * 1000, statement_shape(query), params, plan
+    )
+
+
+class DiagnosticsMiddleware:
+    """ASGI middleware flagging requests with too many or repeated statements"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        shapes = Counter()
+        token = _request_shapes.set(shapes)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_shapes.reset(token)
+            _report(scope, shapes)
+
+
+def _report(scope, shapes):
+    request = f"{scope['method']} {scope['path']}"
+    total = sum(shapes.values())
+    if total > DB_DIAGNOSTICS_MAX_QUERIES:
+        logger.warning("%s issued %d statements (limit %d)", request, total, DB_DIAGNOSTICS_MAX_QUERIES)
+    for shape, count in shapes.items():
+        if count >= DB_DIAGNOSTICS_REPEAT_THRESHOLD:
+            logger.warning("%s ran the same statement %d times (possible N+1): %s", request, count, shape)
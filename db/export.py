@@ -0,0 +1,37 @@
+import csv
+import io
+import json
+from fastapi.responses import StreamingResponse
+from db.async_database import stream_query
+from db.shards import stream_shards
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+async def _ndjson_chunks(batches):
+    async for _, rows in batches:
+        yield "".join(json.dumps(row, default=str) + "\n" for row in rows)
+
+async def _csv_chunks(batches):
+    header_written = False
+    async for columns, rows in batches:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if not header_written:
+            writer.writerow(columns)
+            header_written = True
+        writer.writerows([row[column] for column in columns] for row in rows)
+        yield buffer.getvalue()
+
+async def export_response(query, filename, fmt="ndjson", sharded=False):
+    """Stream the rows of ``query`` to the client as NDJSON or CSV, from every account shard if ``sharded``"""
+    # Executed before the response starts, so a failure is an error status rather than a truncated 200
+    batches = await stream_shards(query) if sharded else await stream_query(query)
+    chunks = _csv_chunks(batches) if fmt == "csv" else _ndjson_chunks(batches)
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
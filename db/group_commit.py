@@ -0,0 +1,108 @@
+"""Group commit for deposits to hot accounts.
+
+Opt-in with DEPOSIT_BATCH_WINDOW_MS > 0. The first deposit to an account
+opens a batch. Deposits to the same account that arrive within the window
+join it, up to DEPOSIT_BATCH_MAX_SIZE, after which the batch closes early.
+A batch is applied with one UPDATE, one journal entry per deposit and one
+commit, so a busy account takes its row lock once per batch instead of
+once per request. Each caller gets the balance right after its own
+deposit, at the cost of up to one window of added latency.
+"""
+import asyncio
+import os
+from decimal import Decimal, ROUND_HALF_UP
+from fastapi import HTTPException
+import metrics
+from db.async_database import execute_read_single_query, execute_update_query, transaction
+from db.journal import record_entry
+from db.replicas import record_write
+from db.shards import borrow_shard
+
+DEPOSIT_BATCH_WINDOW_MS = float(os.environ.get("DEPOSIT_BATCH_WINDOW_MS", "0"))
+DEPOSIT_BATCH_MAX_SIZE = int(os.environ.get("DEPOSIT_BATCH_MAX_SIZE", "100"))
+
+# Balances are DECIMAL(..., 2); amounts are rounded the way the column would round them
+CENT = Decimal("0.01")
+
+
+class DepositBatcher:
+    """Coalesces concurrent deposits per account into single transactions"""
+
+    def __init__(self, window, max_size):
+        self.window = window
+        self.max_size = max_size
+        # Open batches by account number, as lists of (amount, future)
+        self._open = {}
+        # Commits in flight, referenced so they are not garbage collected
+        self._committing = set()
+
+    def __bool__(self):
+        return self.window > 0
+
+    async def deposit(self, account_number, amount):
+        """Add ``amount`` to the account's open batch and wait for it to commit; returns the balance after it"""
+        # Per-caller balances are summed here, so they must match what the column stores
+        amount = amount.quantize(CENT, rounding=ROUND_HALF_UP)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._open.get(account_number)
+        if batch is None:
+            batch = self._open[account_number] = []
+            loop.call_later(self.window, self._close, account_number, batch)
+        batch.append((amount, future))
+        if len(batch) >= self.max_size:
+            self._close(account_number, batch)
+        balance = await future
+        # The commit ran in the context of whichever request opened the batch,
+        # so each caller pins its own reads to the primary here
+        record_write()
+        return balance
+
+    def _close(self, account_number, batch):
+        # The timer also fires for a batch that already closed because it filled up
+        if self._open.get(account_number) is not batch:
+            return
+        del self._open[account_number]
+        task = asyncio.create_task(self._commit(account_number, batch))
+        self._committing.add(task)
+        task.add_done_callback(self._committing.discard)
+
+    async def _commit(self, account_number, batch):
+        total = sum(amount for amount, _ in batch)
+        try:
+            async with borrow_shard(account_number, write=True) as conn, transaction(conn):
+                update_query = """
+                UPDATE account SET balance = balance + %s, journal_entries = journal_entries + %s
+                WHERE account_number = %s
+                """
+                if not await execute_update_query(conn, update_query, (total, len(batch), account_number)):
+                    raise HTTPException(status_code=404, detail="Account not found")
+
+                # Walk forward from the balance before the batch so each deposit has its own
+                balance_query = "SELECT balance, journal_entries FROM account WHERE account_number = %s"
+                account = await execute_read_single_query(conn, balance_query, (account_number,))
+                balance = account["balance"] - total
+                entry_count = account["journal_entries"] - len(batch)
+                balances = []
+                for amount, _ in batch:
+                    balance += amount
+                    entry_count += 1
+                    await record_entry(conn, account_number, "deposit", amount, balance, entry_count)
+                    balances.append(balance)
+        except BaseException as e:
+            # Cancellation included: no caller may be left waiting on a batch that never finished
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e if isinstance(e, Exception) else asyncio.CancelledError())
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        metrics.deposit_batch_size.observe((), len(batch))
+        for (_, future), balance in zip(batch, balances):
+            # A caller that went away has a cancelled future; its deposit still committed
+            if not future.done():
+                future.set_result(balance)
+
+
+deposit_batcher = DepositBatcher(DEPOSIT_BATCH_WINDOW_MS / 1000, DEPOSIT_BATCH_MAX_SIZE)
@@ -0,0 +1,139 @@
+"""Idempotency-Key handling for the endpoints that move money.
+
+The first request with a key claims it by inserting an idempotency_key row
+in the same transaction as its balance change and stores its response
+there before committing. A repeat with the same key gets that response
+replayed: from an in-process LRU when this worker served the original,
+otherwise from the row, without touching the account. A concurrent repeat
+waits on the claimed row and replays once the first commits. Failed
+requests roll back their claim, so they can be retried. Keys expire after
+IDEMPOTENCY_TTL seconds; python -m db.idempotency deletes expired rows.
+"""
+import hashlib
+import json
+import os
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from db.async_database import execute_read_single_query, execute_update_query
+from db.cache import MemoryBackend
+from db.shards import router, borrow_shard_connection
+
+IDEMPOTENCY_TTL = int(os.environ.get("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_CACHE_ENTRIES = int(os.environ.get("IDEMPOTENCY_CACHE_ENTRIES", "10000"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 100
+
+_recent = MemoryBackend(max_entries=IDEMPOTENCY_CACHE_ENTRIES, ttl=IDEMPOTENCY_TTL)
+
+# How requests with a key were served, for /metrics
+counts = {"executed": 0, "replayed_memory": 0, "replayed_database": 0, "mismatched": 0}
+
+def fingerprint(*parts):
+    """Digest of a request's parameters; a key reused with different ones is rejected"""
+    encoded = json.dumps(jsonable_encoder(parts), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+def _replay(stored, digest, source):
+    if stored["request_hash"] != digest:
+        counts["mismatched"] += 1
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    counts[f"replayed_{source}"] += 1
+    return JSONResponse(stored["body"], status_code=stored["status_code"], headers={"Idempotent-Replayed": "true"})
+
+def _stored(row):
+    return {"request_hash": row["request_hash"], "status_code": row["status_code"], "body": json.loads(row["body"])}
+
+async def lookup(scope, key, digest, connection=None):
+    """Replay of a completed request with this key from memory, then from ``connection`` if given; None otherwise"""
+    if key is None:
+        return None
+    stored = await _recent.get(f"{scope}:{key}")
+    if stored is not None:
+        return _replay(stored, digest, "memory")
+    if connection is None:
+        return None
+
+    query = """
+    SELECT request_hash, status_code, body FROM idempotency_key
+    WHERE scope = %s AND idempotency_key = %s AND expires_at > NOW(6) AND status_code IS NOT NULL
+    """
+    row = await execute_read_single_query(connection, query, (scope, key))
+    if not row:
+        return None
+    stored = _stored(row)
+    await _recent.set(f"{scope}:{key}", stored)
+    return _replay(stored, digest, "database")
+
+async def claim(connection, scope, key, digest):
+    """Inside transaction(): take the key for this request, or return the replay of the request that holds it"""
+    if key is None:
+        return None
+    # An expired key can be used again
+    expired_query = "DELETE FROM idempotency_key WHERE scope = %s AND idempotency_key = %s AND expires_at <= NOW(6)"
+    await execute_update_query(connection, expired_query, (scope, key))
+
+    # A concurrent holder makes this wait until it commits or rolls back; only a
+    # duplicate key means the key is taken, any other failure is the request's own
+    claim_query = """
+    INSERT INTO idempotency_key (scope, idempotency_key, request_hash, created_at, expires_at)
+    VALUES (%s, %s, %s, NOW(6), NOW(6) + INTERVAL %s SECOND)
+    """
+    try:
+        await execute_update_query(connection, claim_query, (scope, key, digest, IDEMPOTENCY_TTL))
+        counts["executed"] += 1
+        return None
+    except HTTPException as e:
+        if "Duplicate entry" not in str(e.detail):
+            raise
+
+    # Locking read so the holder's committed row is seen, not this transaction's snapshot
+    query = "SELECT request_hash, status_code, body FROM idempotency_key WHERE scope = %s AND idempotency_key = %s FOR SHARE"
+    row = await execute_read_single_query(connection, query, (scope, key))
+    if not row or row["status_code"] is None:
+        # Purged between the two statements, or held without a stored response
+        raise HTTPException(status_code=409, detail="Idempotency-Key is in use; retry the request")
+    stored = _stored(row)
+    await _recent.set(f"{scope}:{key}", stored)
+    return _replay(stored, digest, "database")
+
+async def save(connection, scope, key, status_code, body):
+    """Store the response in the claimed row before the transaction commits; returns what to remember()"""
+    if key is None:
+        return None
+    encoded = jsonable_encoder(body)
+    query = "UPDATE idempotency_key SET status_code = %s, body = %s WHERE scope = %s AND idempotency_key = %s"
+    await execute_update_query(connection, query, (status_code, json.dumps(encoded), scope, key))
+    return {"status_code": status_code, "body": encoded}
+
+async def remember(scope, key, digest, saved):
+    """Keep a committed response in memory so repeats on this worker skip the database"""
+    if key is not None:
+        await _recent.set(f"{scope}:{key}", {"request_hash": digest, **saved})
+
+def stats():
+    return {**counts, **_recent.stats()}
+
+async def purge(batch_size=5000):
+    """Delete expired keys on every shard in small batches; returns the number deleted"""
+    deleted = 0
+    query = "DELETE FROM idempotency_key WHERE expires_at <= NOW(6) LIMIT %s"
+    for shard in range(len(router)):
+        async with borrow_shard_connection(shard) as conn:
+            while True:
+                removed = await execute_update_query(conn, query, (batch_size,))
+                deleted += removed
+                if removed < batch_size:
+                    break
+    return deleted
+
+if __name__ == "__main__":
+    import asyncio
+
+    async def main():
+        try:
+            return await purge()
+        finally:
+            for shard_pool in router.pools:
+                await shard_pool.dispose()
+
+    print(json.dumps({"deleted": asyncio.run(main())}, indent=2))
@@ -0,0 +1,94 @@
+import asyncio
+import os
+from fastapi import HTTPException
+from db.async_database import pool, borrow_connection, execute_write_query, in_unit_of_work
+from db.shards import SHARDED_TABLES, execute_fan_out_query
+
+ID_BLOCK_SIZE = int(os.environ.get("ID_BLOCK_SIZE", "50"))
+
+# sequence name -> (table, key column, first id handed out)
+SEQUENCES = {
+    "customer": ("customer", "customer_id", 1),
+    "employee": ("employee", "employee_id", 101),
+    "account": ("account", "account_number", 1001),
+    "loan": ("loan", "loan_number", 5001),
+    "payment": ("payment", "payment_number", 7001),
+}
+
+
+class IdAllocator:
+    """Hi/lo primary key allocator backed by the ``id_sequence`` table.
+
+    Each process reserves a block of ``block_size`` ids per sequence with a
+    single atomic ``UPDATE`` and hands them out from memory, so inserts need
+    no extra reads and concurrent workers never receive the same id.
+    """
+
+    def __init__(self, block_size=ID_BLOCK_SIZE):
+        self.block_size = block_size
+        self._blocks = {}
+        self._locks = {}
+
+    async def next_id(self, name, connection=None):
+        """Return the next id for a sequence"""
+        return (await self.reserve(name, 1, connection))[0]
+
+    async def reserve(self, name, count, connection=None):
+        """Return ``count`` fresh ids for a sequence, in ascending order.
+
+        Pass the request's own connection so a block refill runs on it
+        instead of waiting for a second checkout from the same pool.
+        """
+        if name not in SEQUENCES:
+            raise KeyError(f"Unknown id sequence: {name}")
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            ids = []
+            while len(ids) < count:
+                current, end = self._blocks.get(name, (0, 0))
+                if current >= end:
+                    current, end = await self._fetch_block(name, max(self.block_size, count - len(ids)), connection)
+                take = min(end - current, count - len(ids))
+                ids.extend(range(current, current + take))
+                self._blocks[name] = (current + take, end)
+            return ids
+
+    async def _fetch_block(self, name, size, connection=None):
+        # Not inside the caller's transaction: a rollback there would undo a block
+        # this process goes on handing out
+        if connection is not None and connection.pool is pool and not in_unit_of_work(connection):
+            return await self._fetch_on(connection, name, size)
+        async with borrow_connection() as conn:
+            return await self._fetch_on(conn, name, size)
+
+    async def _fetch_on(self, conn, name, size):
+        # LAST_INSERT_ID(expr) makes the new high-water mark come back in the OK packet
+        update_query = """
+        UPDATE id_sequence SET next_value = LAST_INSERT_ID(next_value + %s)
+        WHERE sequence_name = %s
+        """
+        upper = await execute_write_query(conn, update_query, (size, name))
+        if not upper:
+            await self._seed(conn, name)
+            upper = await execute_write_query(conn, update_query, (size, name))
+        if not upper:
+            raise HTTPException(status_code=500, detail=f"Could not allocate ids for {name}")
+        return upper - size, upper
+
+    @staticmethod
+    async def _seed(conn, name):
+        """Create the sequence row, continuing after any ids already in the table"""
+        table, column, start = SEQUENCES[name]
+        floor = start
+        if table in SHARDED_TABLES:
+            # Rows on the other shards count too, or their numbers would be handed out again
+            max_query = f"SELECT MAX({column}) AS top FROM {table}"
+            tops = [row["top"] for row in await execute_fan_out_query(max_query, connection=conn)]
+            floor = max([start] + [top + 1 for top in tops if top is not None])
+        seed_query = f"""
+        INSERT IGNORE INTO id_sequence (sequence_name, next_value)
+        SELECT %s, GREATEST(COALESCE(MAX({column}) + 1, %s), %s) FROM {table}
+        """
+        await execute_write_query(conn, seed_query, (name, start, floor))
+
+allocator = IdAllocator()
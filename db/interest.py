@@ -0,0 +1,164 @@
+"""Set-based interest accrual for savings accounts.
+
+Usage: python -m db.interest --run-id 2024-06-30 [--days 30] [--chunk-size 10000]
+       [--concurrency 4]
+
+Each shard is walked in account-number chunks aligned to multiples of the
+chunk size. A chunk is one database transaction: claim its
+interest_accrual audit row, journal one 'interest' entry per account with
+INSERT ... SELECT under a reference naming the run and chunk, apply
+exactly those entries with a single UPDATE ... JOIN, and record the
+totals. A chunk that committed is never applied twice, so re-running a run
+id after a crash resumes from the chunks that are missing; rebalance copies
+the audit rows along with the accounts they cover.
+"""
+import asyncio
+import os
+from decimal import Decimal
+from db.async_database import execute_read_query, execute_read_single_query, execute_update_query, transaction
+from db.journal import DB_JOURNAL_CHECKPOINT_INTERVAL
+from db.shards import router, borrow_shard_connection
+
+INTEREST_CHUNK_SIZE = int(os.environ.get("INTEREST_CHUNK_SIZE", "10000"))
+
+# interest_rate is an annual percentage
+DAYS_PER_YEAR = 365
+
+async def _chunk_size(conn, run_id, chunk_size):
+    """The chunk size a run started with, so a resumed run keeps the same boundaries"""
+    query = "SELECT range_end - range_start AS size FROM interest_accrual WHERE run_id = %s LIMIT 1"
+    row = await execute_read_single_query(conn, query, (run_id,))
+    return row["size"] if row else chunk_size
+
+async def _accrue_chunk(shard, run_id, start, end, days):
+    """Accrue one chunk in a single transaction; returns its totals, or None if it was already done"""
+    async with borrow_shard_connection(shard) as conn, transaction(conn):
+        # Claiming the chunk first makes a concurrent run of the same id wait here, then skip it
+        claim_query = """
+        INSERT IGNORE INTO interest_accrual (run_id, range_start, range_end, days, accounts, interest_total, finished_at)
+        VALUES (%s, %s, %s, %s, 0, 0, NOW(6))
+        """
+        if not await execute_update_query(conn, claim_query, (run_id, start, end, days)):
+            return None
+
+        # Interest is computed once, from the balances locked by this read, and journaled
+        # under a reference naming this run and chunk
+        reference = f"interest:{run_id}:{start}"
+        journal_query = """
+        INSERT INTO `transaction` (account_number, kind, amount, created_at, reference)
+        SELECT a.account_number, 'interest', ROUND(a.balance * s.interest_rate / 100 * %s / %s, 2), NOW(6), %s
+        FROM account a
+        JOIN savings_account s ON s.account_number = a.account_number
+        WHERE a.account_number >= %s AND a.account_number < %s
+          AND ROUND(a.balance * s.interest_rate / 100 * %s / %s, 2) > 0
+        """
+        accounts = await execute_update_query(
+            conn, journal_query, (days, DAYS_PER_YEAR, reference, start, end, days, DAYS_PER_YEAR)
+        )
+        interest_total = Decimal("0")
+
+        if accounts:
+            # Apply exactly the entries journaled above
+            apply_query = """
+            UPDATE account a
+            JOIN `transaction` t ON t.account_number = a.account_number AND t.reference = %s
+            SET a.balance = a.balance + t.amount, a.journal_entries = a.journal_entries + 1
+            """
+            await execute_update_query(conn, apply_query, (reference,))
+
+            checkpoint_query = """
+            INSERT INTO balance_checkpoint (account_number, transaction_id, as_of, balance)
+            SELECT a.account_number, t.transaction_id, t.created_at, a.balance
+            FROM account a
+            JOIN `transaction` t ON t.account_number = a.account_number AND t.reference = %s
+            WHERE MOD(a.journal_entries - 1, %s) = 0
+            """
+            await execute_update_query(conn, checkpoint_query, (reference, DB_JOURNAL_CHECKPOINT_INTERVAL))
+
+            total_query = "SELECT COALESCE(SUM(amount), 0) AS total FROM `transaction` WHERE reference = %s"
+            interest_total = (await execute_read_single_query(conn, total_query, (reference,)))["total"]
+
+        audit_query = """
+        UPDATE interest_accrual SET accounts = %s, interest_total = %s, finished_at = NOW(6)
+        WHERE run_id = %s AND range_start = %s
+        """
+        await execute_update_query(conn, audit_query, (accounts, interest_total, run_id, start))
+        return {"accounts": accounts, "interest_total": interest_total}
+
+async def _accrue_shard(shard, run_id, days, chunk_size, concurrency):
+    async with borrow_shard_connection(shard) as conn:
+        chunk_size = await _chunk_size(conn, run_id, chunk_size)
+        bounds = await execute_read_single_query(
+            conn, "SELECT MIN(account_number) AS low, MAX(account_number) AS high FROM savings_account"
+        )
+        done_query = "SELECT range_start FROM interest_accrual WHERE run_id = %s"
+        done = {row["range_start"] for row in await execute_read_query(conn, done_query, (run_id,))}
+    if bounds["low"] is None:
+        return {"chunks": 0, "accounts": 0, "interest_total": Decimal("0")}
+
+    pending = asyncio.Queue()
+    for start in range(bounds["low"] // chunk_size * chunk_size, bounds["high"] + 1, chunk_size):
+        if start not in done:
+            pending.put_nowait(start)
+
+    totals = {"chunks": 0, "accounts": 0, "interest_total": Decimal("0")}
+
+    async def worker():
+        while not pending.empty():
+            start = pending.get_nowait()
+            audit = await _accrue_chunk(shard, run_id, start, start + chunk_size, days)
+            if audit is not None:
+                totals["chunks"] += 1
+                totals["accounts"] += audit["accounts"]
+                totals["interest_total"] += audit["interest_total"]
+
+    await asyncio.gather(*[worker() for _ in range(max(1, concurrency))])
+    return totals
+
+async def accrue(run_id, days=1, chunk_size=INTEREST_CHUNK_SIZE, concurrency=1):
+    """Accrue ``days`` of interest on every savings account, resuming ``run_id`` if it was interrupted"""
+    summary = {"run_id": run_id, "days": days, "chunks": 0, "accounts": 0, "interest_total": Decimal("0")}
+    for shard in range(len(router)):
+        totals = await _accrue_shard(shard, run_id, days, chunk_size, concurrency)
+        for key, value in totals.items():
+            summary[key] += value
+    return summary
+
+async def progress(run_id):
+    """Chunks, accounts and interest recorded so far for a run, across every shard"""
+    query = """
+    SELECT COUNT(*) AS chunks, COALESCE(SUM(accounts), 0) AS accounts,
+           COALESCE(SUM(interest_total), 0) AS interest_total, MAX(finished_at) AS last_finished_at
+    FROM interest_accrual WHERE run_id = %s
+    """
+    summary = {"run_id": run_id, "chunks": 0, "accounts": 0, "interest_total": Decimal("0"), "last_finished_at": None}
+    for shard in range(len(router)):
+        async with borrow_shard_connection(shard) as conn:
+            row = await execute_read_single_query(conn, query, (run_id,))
+        summary["chunks"] += row["chunks"]
+        summary["accounts"] += int(row["accounts"])
+        summary["interest_total"] += row["interest_total"]
+        if row["last_finished_at"] and (summary["last_finished_at"] is None or row["last_finished_at"] > summary["last_finished_at"]):
+            summary["last_finished_at"] = row["last_finished_at"]
+    return summary
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from db.async_database import pool
+
+    parser = argparse.ArgumentParser(description="Accrue interest on every savings account")
+    parser.add_argument("--run-id", required=True, help="Re-running the same id resumes it instead of accruing twice")
+    parser.add_argument("--days", type=int, default=1, help="Days of interest to accrue")
+    parser.add_argument("--chunk-size", type=int, default=INTEREST_CHUNK_SIZE, help="Account numbers per chunk")
+    parser.add_argument("--concurrency", type=int, default=1, help="Chunks processed in parallel per shard")
+    args = parser.parse_args()
+
+    async def main():
+        try:
+            return await accrue(args.run_id, args.days, args.chunk_size, args.concurrency)
+        finally:
+            for shard_pool in router.pools:
+                await shard_pool.dispose()
+
+    print(json.dumps(asyncio.run(main()), indent=2, default=str))
@@ -0,0 +1,60 @@
+"""Append-only journal of balance changes with periodic per-account checkpoints.
+
+Every balance change appends a ``transaction`` row in the same database
+transaction as the UPDATE, and every DB_JOURNAL_CHECKPOINT_INTERVAL-th
+entry of an account also stores its balance in ``balance_checkpoint``.
+A balance as of any moment is then the nearest earlier checkpoint plus
+fewer than that many journal entries. Both tables live on the account's shard.
+"""
+import os
+from db.async_database import execute_read_single_query, execute_write_query
+
+DB_JOURNAL_CHECKPOINT_INTERVAL = int(os.environ.get("DB_JOURNAL_CHECKPOINT_INTERVAL", "100"))
+
+async def record_entry(connection, account_number, kind, amount, balance, entry_count):
+    """Journal a balance change made on ``connection`` inside a transaction() block.
+
+    ``balance`` and ``entry_count`` are the account's balance and
+    journal_entries read back after its UPDATE; the count decides whether
+    this entry also carries a checkpoint.
+    """
+    entry_query = """
+    INSERT INTO `transaction` (account_number, kind, amount, created_at)
+    VALUES (%s, %s, %s, NOW(6))
+    """
+    transaction_id = await execute_write_query(connection, entry_query, (account_number, kind, amount))
+
+    # The first entry of an account and every interval after it carry a checkpoint
+    if (entry_count - 1) % DB_JOURNAL_CHECKPOINT_INTERVAL == 0:
+        checkpoint_query = """
+        INSERT INTO balance_checkpoint (account_number, transaction_id, as_of, balance)
+        SELECT account_number, transaction_id, created_at, %s
+        FROM `transaction` WHERE account_number = %s AND transaction_id = %s
+        """
+        await execute_write_query(connection, checkpoint_query, (balance, account_number, transaction_id))
+    return transaction_id
+
+async def balance_as_of(connection, account_number, as_of=None):
+    """Balance at ``as_of`` (default now), or None if the account has no history that far back"""
+    # Nearest checkpoint at or before as_of, plus the journal entries after it;
+    # the (account_number, created_at) index bounds the scan to one checkpoint interval
+    query = """
+    SELECT COALESCE(%s, NOW(6)) AS as_of,
+           cp.as_of AS checkpoint_as_of,
+           cp.balance + COALESCE(SUM(t.amount), 0) AS balance,
+           COUNT(t.transaction_id) AS entries_scanned
+    FROM (
+        SELECT balance, transaction_id, as_of FROM balance_checkpoint
+        WHERE account_number = %s AND as_of <= COALESCE(%s, NOW(6))
+        ORDER BY as_of DESC
+        LIMIT 1
+    ) cp
+    LEFT JOIN `transaction` t
+        ON t.account_number = %s
+       AND t.created_at >= cp.as_of AND t.created_at <= COALESCE(%s, NOW(6))
+       AND t.transaction_id > cp.transaction_id
+    GROUP BY cp.as_of, cp.balance
+    """
+    return await execute_read_single_query(
+        connection, query, (as_of, account_number, as_of, account_number, as_of)
+    )
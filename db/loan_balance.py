@@ -0,0 +1,103 @@
+"""Running per-loan totals kept in ``loan_balance``.
+
+Every loan has one loan_balance row, inserted with the loan and updated in
+the same transaction as each payment, so the outstanding amount is a
+primary-key read instead of a SUM over the loan's payments. rebuild()
+recomputes the table from loan and loan_payment in loan-number chunks.
+
+Usage: python -m db.loan_balance [--chunk-size 10000]
+"""
+from collections import defaultdict
+from db.async_database import execute_write_query, execute_many_query
+
+LOAN_BALANCE_CHUNK_SIZE = 10000
+
+async def open_loan(connection, loan_number, principal):
+    """Start the running totals of a loan created on ``connection``"""
+    query = """
+    INSERT INTO loan_balance (loan_number, principal, total_paid, outstanding, last_payment_date, payment_count)
+    VALUES (%s, %s, 0, %s, NULL, 0)
+    """
+    await execute_write_query(connection, query, (loan_number, principal, principal))
+
+async def apply_payments(connection, payments):
+    """Add ``payments`` (PaymentCreate-like objects) to their loans' totals, one UPDATE per loan.
+
+    Returns the amount paid per loan number.
+    """
+    totals = defaultdict(lambda: [0, None, 0])
+    for payment in payments:
+        total = totals[payment.loan_number]
+        total[0] += payment.payment_amount
+        total[1] = max(total[1] or payment.payment_date, payment.payment_date)
+        total[2] += 1
+
+    query = """
+    UPDATE loan_balance
+    SET total_paid = total_paid + %s,
+        outstanding = outstanding - %s,
+        last_payment_date = GREATEST(COALESCE(last_payment_date, %s), %s),
+        payment_count = payment_count + %s
+    WHERE loan_number = %s
+    """
+    # Sorted so concurrent batches lock loan rows in the same order
+    await execute_many_query(connection, query, [
+        (amount, amount, last_date, last_date, count, loan_number)
+        for loan_number, (amount, last_date, count) in sorted(totals.items())
+    ])
+    return {loan_number: amount for loan_number, (amount, _, _) in totals.items()}
+
+def rebuild(connection, chunk_size=LOAN_BALANCE_CHUNK_SIZE):
+    """Recompute every loan's totals from its payments; returns the number of loans written"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT MIN(loan_number), MAX(loan_number) FROM loan")
+        low, high = cursor.fetchone()
+        if low is None:
+            return 0
+
+        written = 0
+        for start in range(low, high + 1, chunk_size):
+            # One INSERT ... SELECT per chunk keeps each transaction short
+            cursor.execute("""
+            REPLACE INTO loan_balance (loan_number, principal, total_paid, outstanding, last_payment_date, payment_count)
+            SELECT l.loan_number, l.amount, COALESCE(p.total_paid, 0), l.amount - COALESCE(p.total_paid, 0),
+                   p.last_payment_date, COALESCE(p.payment_count, 0)
+            FROM loan l
+            LEFT JOIN (
+                SELECT lp.loan_number, SUM(p.payment_amount) AS total_paid,
+                       MAX(p.payment_date) AS last_payment_date, COUNT(*) AS payment_count
+                FROM loan_payment lp
+                JOIN payment p ON p.payment_number = lp.payment_number
+                WHERE lp.loan_number >= %s AND lp.loan_number < %s
+                GROUP BY lp.loan_number
+            ) p ON p.loan_number = l.loan_number
+            WHERE l.loan_number >= %s AND l.loan_number < %s
+            """, (start, start + chunk_size, start, start + chunk_size))
+            cursor.execute("SELECT COUNT(*) FROM loan WHERE loan_number >= %s AND loan_number < %s", (start, start + chunk_size))
+            written += cursor.fetchone()[0]
+            connection.commit()
+        return written
+    finally:
+        cursor.close()
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import time
+    from db.connection import create_db_connection
+    from db.database import DB_HOST, DB_USER, DB_PASSWORD, DB_NAME
+
+    parser = argparse.ArgumentParser(description="Rebuild loan_balance from loan and loan_payment")
+    parser.add_argument("--chunk-size", type=int, default=LOAN_BALANCE_CHUNK_SIZE, help="Loan numbers per transaction")
+    args = parser.parse_args()
+
+    db_connection = create_db_connection(DB_HOST, DB_USER, DB_PASSWORD, DB_NAME)
+    if db_connection is None:
+        raise SystemExit(1)
+    try:
+        started = time.perf_counter()
+        loans = rebuild(db_connection, args.chunk_size)
+        print(json.dumps({"loans": loans, "seconds": round(time.perf_counter() - started, 2)}, indent=2))
+    finally:
+        db_connection.close()
@@ -0,0 +1,354 @@
+from mysql.connector import Error
+
+# Named lock so concurrently starting processes do not race on the same migration
+MIGRATION_LOCK = "banking_system_migrations"
+MIGRATION_LOCK_TIMEOUT = 60
+
+# Errors meaning a statement's effect is already present; re-running a
+# partially applied migration skips them instead of failing
+ALREADY_APPLIED_ERRORS = {
+    1050,  # ER_TABLE_EXISTS_ERROR
+    1060,  # ER_DUP_FIELDNAME
+    1061,  # ER_DUP_KEYNAME
+}
+
+# (version, description, statements), applied in order and recorded in schema_migrations
+MIGRATIONS = [
+    (1, "Initial schema", [
+        """
+        CREATE TABLE IF NOT EXISTS branch (
+            branch_name VARCHAR(50) PRIMARY KEY,
+            branch_city VARCHAR(50),
+            assets DECIMAL(15,2)
+        );
+        """,
+
+        """
+        CREATE TABLE IF NOT EXISTS customer (
+            customer_id INT PRIMARY KEY,
+            customer_name VARCHAR(50),
+            customer_street VARCHAR(100),
+            customer_city VARCHAR(50)
+        );
+        """,
+
+        """
+        CREATE TABLE IF NOT EXISTS employee (
+            employee_id INT PRIMARY KEY,
+            employee_name VARCHAR(50),
+            telephone_number VARCHAR(20),
+            dependent_name VARCHAR(50),
+            start_date DATE,
+            employment_length INT
+        );
+        """,
+
+        """
+        CREATE TABLE IF NOT EXISTS cust_banker (
+            customer_id INT,
+            employee_id INT,
+            type VARCHAR(20),
+            PRIMARY KEY (customer_id, employee_id),
+            FOREIGN KEY (customer_id) REFERENCES customer(customer_id),
+            FOREIGN KEY (employee_id) REFERENCES employee(employee_id)
+        );
+        """,
+
+        """
+        CREATE TABLE IF NOT EXISTS works_for (
+            manager_id INT,
+            worker_id INT,
+            FOREIGN KEY (manager_id) REFERENCES employee(employee_id),
+            FOREIGN KEY (worker_id) REFERENCES employee(employee_id)
+        );
+        """,
+
+        """
+        CREATE TABLE IF NOT EXISTS account (
+            account_number INT PRIMARY KEY,
+            balance DECIMAL(15,2)
+        );
+        """,
+
+        """
+        CREATE TABLE IF NOT EXISTS depositor (
+            customer_id INT,
+            account_number INT,
+            access_date DATE,
+            PRIMARY KEY (customer_id, account_number),
+            FOREIGN KEY (customer_id) REFERENCES customer(customer_id),
+            FOREIGN KEY (account_number) REFERENCES account(account_number)
+        );
+        """,
+
+        """
+        CREATE TABLE IF NOT EXISTS savings_account (
+            account_number INT PRIMARY KEY,
+            interest_rate DECIMAL(5,2),
+            FOREIGN KEY (account_number) REFERENCES account(account_number)
+        );
+        """,
+
+        """
+        CREATE TABLE IF NOT EXISTS checking_account (
+            account_number INT PRIMARY KEY,
+            overdraft_amount DECIMAL(10,2),
+            FOREIGN KEY (account_number) REFERENCES account(account_number)
+        );
+        """,
+
+        """
+        CREATE TABLE IF NOT EXISTS loan (
+            loan_number INT PRIMARY KEY,
+            amount DECIMAL(15,2)
+        );
+        """,
+
+        """
+        CREATE TABLE IF NOT EXISTS loan_branch (
+            branch_name VARCHAR(50),
+            loan_number INT,
+            PRIMARY KEY (branch_name, loan_number),
+            FOREIGN KEY (branch_name) REFERENCES branch(branch_name),
+            FOREIGN KEY (loan_number) REFERENCES loan(loan_number)
+        );
+        """,
+
+        """
+        CREATE TABLE IF NOT EXISTS borrower (
+            customer_id INT,
+            loan_number INT,
+            PRIMARY KEY (customer_id, loan_number),
+            FOREIGN KEY (customer_id) REFERENCES customer(customer_id),
+            FOREIGN KEY (loan_number) REFERENCES loan(loan_number)
+        );
+        """,
+
+        """
+        CREATE TABLE IF NOT EXISTS payment (
+            payment_number INT PRIMARY KEY,
+            payment_date DATE,
+            payment_amount DECIMAL(10,2)
+        );
+        """,
+
+        """
+        CREATE TABLE IF NOT EXISTS loan_payment (
+            loan_number INT,
+            account_number INT,
+            payment_number INT,
+            PRIMARY KEY (loan_number, account_number, payment_number),
+            FOREIGN KEY (loan_number) REFERENCES loan(loan_number),
+            FOREIGN KEY (account_number) REFERENCES account(account_number),
+            FOREIGN KEY (payment_number) REFERENCES payment(payment_number)
+        );
+        """,
+
+        """
+        CREATE TABLE IF NOT EXISTS id_sequence (
+            sequence_name VARCHAR(50) PRIMARY KEY,
+            next_value BIGINT NOT NULL
+        );
+        """
+    ]),
+
+    (2, "Secondary indexes for foreign-key and date lookups", [
+        "CREATE INDEX idx_loan_payment_account ON loan_payment (account_number)",
+        "CREATE INDEX idx_loan_payment_payment ON loan_payment (payment_number)",
+        "CREATE INDEX idx_depositor_account ON depositor (account_number)",
+        "CREATE INDEX idx_borrower_loan ON borrower (loan_number)",
+        "CREATE INDEX idx_loan_branch_loan ON loan_branch (loan_number)",
+        "CREATE INDEX idx_works_for_manager ON works_for (manager_id)",
+        "CREATE INDEX idx_works_for_worker ON works_for (worker_id)",
+        "CREATE INDEX idx_payment_date ON payment (payment_date)",
+    ]),
+
+    (3, "Account shard directory", [
+        """
+        CREATE TABLE IF NOT EXISTS account_shard (
+            range_start INT PRIMARY KEY,
+            range_end INT NOT NULL,
+            shard INT NOT NULL,
+            moving BOOLEAN NOT NULL DEFAULT FALSE
+        );
+        """,
+    ]),
+
+    (4, "Transaction journal and balance checkpoints", [
+        """
+        CREATE TABLE IF NOT EXISTS `transaction` (
+            account_number INT NOT NULL,
+            transaction_id BIGINT NOT NULL AUTO_INCREMENT,
+            kind VARCHAR(20) NOT NULL,
+            amount DECIMAL(15,2) NOT NULL,
+            created_at DATETIME(6) NOT NULL,
+            PRIMARY KEY (account_number, transaction_id),
+            KEY idx_transaction_id (transaction_id),
+            KEY idx_transaction_account_time (account_number, created_at)
+        );
+        """,
+
+        """
+        CREATE TABLE IF NOT EXISTS balance_checkpoint (
+            account_number INT NOT NULL,
+            transaction_id BIGINT NOT NULL,
+            as_of DATETIME(6) NOT NULL,
+            balance DECIMAL(15,2) NOT NULL,
+            PRIMARY KEY (account_number, transaction_id),
+            KEY idx_balance_checkpoint_as_of (account_number, as_of)
+        );
+        """,
+
+        # Journal entries per account, so checkpoints can be taken every N changes
+        "ALTER TABLE account ADD COLUMN journal_entries INT NOT NULL DEFAULT 0",
+
+        # History starts now for accounts that predate the journal
+        """
+        INSERT IGNORE INTO balance_checkpoint (account_number, transaction_id, as_of, balance)
+        SELECT account_number, 0, NOW(6), COALESCE(balance, 0) FROM account
+        """,
+    ]),
+
+    (5, "Interest accrual audit", [
+        """
+        CREATE TABLE IF NOT EXISTS interest_accrual (
+            run_id VARCHAR(40) NOT NULL,
+            range_start INT NOT NULL,
+            range_end INT NOT NULL,
+            days INT NOT NULL,
+            accounts INT NOT NULL,
+            interest_total DECIMAL(15,2) NOT NULL,
+            finished_at DATETIME(6) NOT NULL,
+            PRIMARY KEY (run_id, range_start)
+        );
+        """,
+    ]),
+
+    (6, "Loan balance summary", [
+        """
+        CREATE TABLE IF NOT EXISTS loan_balance (
+            loan_number INT PRIMARY KEY,
+            principal DECIMAL(15,2) NOT NULL,
+            total_paid DECIMAL(15,2) NOT NULL,
+            outstanding DECIMAL(15,2) NOT NULL,
+            last_payment_date DATE,
+            payment_count INT NOT NULL,
+            FOREIGN KEY (loan_number) REFERENCES loan(loan_number)
+        );
+        """,
+
+        # Totals for loans that predate the table; python -m db.loan_balance recomputes them later
+        """
+        INSERT IGNORE INTO loan_balance (loan_number, principal, total_paid, outstanding, last_payment_date, payment_count)
+        SELECT l.loan_number, l.amount, COALESCE(SUM(p.payment_amount), 0), l.amount - COALESCE(SUM(p.payment_amount), 0),
+               MAX(p.payment_date), COUNT(p.payment_number)
+        FROM loan l
+        LEFT JOIN loan_payment lp ON lp.loan_number = l.loan_number
+        LEFT JOIN payment p ON p.payment_number = lp.payment_number
+        GROUP BY l.loan_number, l.amount
+        """,
+    ]),
+
+    (7, "Branch loan book summary", [
+        """
+        CREATE TABLE IF NOT EXISTS branch_loan_summary (
+            branch_name VARCHAR(50) PRIMARY KEY,
+            loan_count INT NOT NULL,
+            loan_total DECIMAL(17,2) NOT NULL,
+            total_paid DECIMAL(17,2) NOT NULL,
+            outstanding DECIMAL(17,2) NOT NULL,
+            FOREIGN KEY (branch_name) REFERENCES branch(branch_name)
+        );
+        """,
+
+        """
+        INSERT IGNORE INTO branch_loan_summary (branch_name, loan_count, loan_total, total_paid, outstanding)
+        SELECT br.branch_name, COUNT(lb.loan_number), COALESCE(SUM(b.principal), 0),
+               COALESCE(SUM(b.total_paid), 0), COALESCE(SUM(b.outstanding), 0)
+        FROM branch br
+        LEFT JOIN loan_branch lb ON lb.branch_name = br.branch_name
+        LEFT JOIN loan_balance b ON b.loan_number = lb.loan_number
+        GROUP BY br.branch_name
+        """,
+    ]),
+
+    (8, "Idempotency keys", [
+        """
+        CREATE TABLE IF NOT EXISTS idempotency_key (
+            scope VARCHAR(40) NOT NULL,
+            idempotency_key VARCHAR(100) NOT NULL,
+            request_hash CHAR(64) NOT NULL,
+            status_code SMALLINT,
+            body TEXT,
+            created_at DATETIME(6) NOT NULL,
+            expires_at DATETIME(6) NOT NULL,
+            PRIMARY KEY (scope, idempotency_key),
+            KEY idx_idempotency_key_expires (expires_at)
+        );
+        """,
+    ]),
+
+    (9, "Journal entry references", [
+        # Which batch job wrote an entry, e.g. interest:<run id>:<chunk start>
+        "ALTER TABLE `transaction` ADD COLUMN reference VARCHAR(80) NULL",
+        "CREATE INDEX idx_transaction_reference ON `transaction` (reference, account_number)",
+    ]),
+]
+
+def _execute_idempotent(cursor, statement):
+    try:
+        cursor.execute(statement)
+    except Error as err:
+        if err.errno not in ALREADY_APPLIED_ERRORS:
+            raise
+
+def apply_migrations(connection, target=None):
+    """Apply every pending migration up to ``target`` (default: latest); returns the versions applied"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(200),
+            applied_at DATETIME NOT NULL
+        )
+        """)
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT))
+        (acquired,) = cursor.fetchone()
+        if not acquired:
+            raise RuntimeError("Timed out waiting for another process to finish migrating")
+        try:
+            cursor.execute("SELECT version FROM schema_migrations")
+            applied = {version for (version,) in cursor.fetchall()}
+            newly_applied = []
+            for version, description, statements in MIGRATIONS:
+                if version in applied or (target is not None and version > target):
+                    continue
+                for statement in statements:
+                    _execute_idempotent(cursor, statement)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description, applied_at) VALUES (%s, %s, NOW())",
+                    (version, description)
+                )
+                connection.commit()
+                print(f"Applied migration {version}: {description}")
+                newly_applied.append(version)
+            return newly_applied
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+            cursor.fetchone()
+    finally:
+        cursor.close()
+
+if __name__ == "__main__":
+    # Upgrade an existing database in place using the runtime DB_* settings
+    from db.database import DB_HOST, DB_USER, DB_PASSWORD, DB_NAME
+    from db.connection import create_db_connection
+
+    db_connection = create_db_connection(DB_HOST, DB_USER, DB_PASSWORD, DB_NAME)
+    if db_connection is None:
+        raise SystemExit(1)
+    try:
+        apply_migrations(db_connection)
+    finally:
+        db_connection.close()
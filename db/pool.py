@@ -0,0 +1,230 @@
+import asyncio
+import time
+from collections import deque
+from db.statements import StatementCache
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the pool timeout"""
+
+
+class _PoolEntry:
+    """A raw connection owned by the pool plus its bookkeeping timestamps"""
+
+    __slots__ = ("connection", "created_at", "last_used", "statements")
+
+    def __init__(self, connection, statement_cache_size=0):
+        self.connection = connection
+        self.statements = StatementCache(statement_cache_size) if statement_cache_size else None
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class AsyncPooledConnection:
+    """Proxy handed out by the pool; ``await close()`` returns the connection instead of closing it"""
+
+    # Set while the borrower is inside a transaction() block
+    unit_of_work = False
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    @property
+    def pool(self):
+        """The pool this connection was checked out from"""
+        return self._pool
+
+    @property
+    def statement_cache(self):
+        """Prepared-statement cache of the underlying connection, or None if disabled"""
+        entry = self.__dict__.get("_entry")
+        return entry.statements if entry is not None else None
+
+    def __getattr__(self, name):
+        entry = self.__dict__.get("_entry")
+        if entry is None:
+            raise AttributeError(f"Connection already returned to the pool ({name})")
+        return getattr(entry.connection, name)
+
+    async def close(self):
+        entry, self._entry = self._entry, None
+        if entry is not None:
+            await self._pool.release(entry)
+
+
+class _BasePool:
+    """Pool settings and counters"""
+
+    def __init__(self, connect, size=5, max_overflow=10, timeout=30.0, recycle=3600, pre_ping=True,
+                 statement_cache_size=0):
+        self._connect = connect
+        self.statement_cache_size = statement_cache_size
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._idle = deque()
+        self._opened = 0
+        self._in_use = 0
+        self._waiting = 0
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._recycled = 0
+        self._invalidated = 0
+        self._checkout_time_total = 0.0
+        self._checkout_time_max = 0.0
+
+    def _record_checkout(self, elapsed):
+        self._checkouts += 1
+        self._checkout_time_total += elapsed
+        if elapsed > self._checkout_time_max:
+            self._checkout_time_max = elapsed
+
+    def _snapshot(self):
+        checkouts = self._checkouts
+        return {
+            "size": self.size,
+            "max_overflow": self.max_overflow,
+            "opened": self._opened,
+            "idle": len(self._idle),
+            "in_use": self._in_use,
+            "waiting": self._waiting,
+            "checkouts": checkouts,
+            "timeouts": self._timeouts,
+            "recycled": self._recycled,
+            "invalidated": self._invalidated,
+            "checkout_time_avg_ms": (self._checkout_time_total / checkouts * 1000) if checkouts else 0.0,
+            "checkout_time_max_ms": self._checkout_time_max * 1000,
+        }
+
+    def _new_entry(self, connection):
+        return _PoolEntry(connection, self.statement_cache_size)
+
+    def _is_stale(self, entry):
+        return self.recycle is not None and time.monotonic() - entry.created_at > self.recycle
+
+    def _exhausted(self):
+        self._timeouts += 1
+        return PoolTimeout(f"Connection pool exhausted ({self._opened} open, timeout {self.timeout}s)")
+
+
+class AsyncConnectionPool(_BasePool):
+    """Asyncio pool of mysql-connector connections.
+
+    Keeps up to ``size`` idle connections around, opens up to ``max_overflow``
+    extra ones under load (closed again when returned), waits at most
+    ``timeout`` seconds for a free slot, replaces connections older than
+    ``recycle`` seconds and optionally pings idle connections before reuse.
+    ``connect`` is a coroutine function returning a ``mysql.connector.aio``
+    connection; waiting for a slot suspends the task instead of a thread.
+    """
+
+    def __init__(self, connect, **kwargs):
+        super().__init__(connect, **kwargs)
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        """Check out a connection, opening one if the pool has room"""
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        async with self._cond:
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._opened < self.size + self.max_overflow:
+                    self._opened += 1
+                    entry = None
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise self._exhausted()
+                self._waiting += 1
+                try:
+                    await asyncio.wait_for(self._cond.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    self._waiting -= 1
+            self._in_use += 1
+
+        try:
+            entry = await self._checkout(entry)
+        except BaseException:
+            async with self._cond:
+                self._in_use -= 1
+                self._opened -= 1
+                self._cond.notify()
+            raise
+
+        self._record_checkout(time.perf_counter() - start)
+        return AsyncPooledConnection(self, entry)
+
+    async def release(self, entry):
+        """Return a connection to the pool, discarding it if it is broken or surplus"""
+        connection = entry.connection
+        healthy = True
+        try:
+            if connection.in_transaction:
+                await connection.rollback()
+        except Exception:
+            healthy = False
+
+        discard = None
+        async with self._cond:
+            self._in_use -= 1
+            if healthy and len(self._idle) < self.size:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+            else:
+                self._opened -= 1
+                discard = connection
+            self._cond.notify()
+        if discard is not None:
+            await self._aclose_quietly(discard)
+
+    async def dispose(self):
+        """Close every idle connection; checked-out ones are closed when returned"""
+        idle = list(self._idle)
+        self._idle.clear()
+        self._opened -= len(idle)
+        for entry in idle:
+            await self._aclose_quietly(entry.connection)
+
+    def stats(self):
+        """Snapshot of pool occupancy and checkout latency"""
+        return self._snapshot()
+
+    async def _checkout(self, entry):
+        if entry is None:
+            return self._new_entry(await self._connect())
+
+        if self._is_stale(entry):
+            await self._aclose_quietly(entry.connection)
+            self._recycled += 1
+            return self._new_entry(await self._connect())
+
+        if self.pre_ping and not await self._ping(entry.connection):
+            await self._aclose_quietly(entry.connection)
+            self._invalidated += 1
+            return self._new_entry(await self._connect())
+
+        return entry
+
+    @staticmethod
+    async def _ping(connection):
+        try:
+            return await connection.is_connected()
+        except Exception:
+            return False
+
+    @staticmethod
+    async def _aclose_quietly(connection):
+        try:
+            await connection.close()
+        except Exception:
+            pass
@@ -0,0 +1,118 @@
+"""Read replica selection and read-your-writes tracking.
+
+The execute_read_* helpers send a statement to a replica only when it is
+safe to: the connection is not inside a transaction() block and the
+current client has not written within DB_REPLICA_STICKY_SECONDS. Writes
+note their time in a request-scoped slot, and ReadYourWritesMiddleware
+carries it across requests in a cookie so a client's follow-up reads also
+stay on the primary until the replicas have had time to catch up.
+"""
+import itertools
+import time
+from contextvars import ContextVar
+from http.cookies import SimpleCookie
+
+STICKY_COOKIE = "db_last_write"
+
+# Time of the current client's last write, as a one-item list; None outside a request
+_last_write = ContextVar("last_write", default=None)
+
+# Where reads were sent, for the stats endpoint
+routed = {"primary": 0, "replica": 0, "sticky": 0}
+
+
+class ReplicaSet:
+    """Round-robin over replica pools, skipping any that failed a checkout recently.
+
+    Health checks are passive: a replica whose checkout raises is taken out
+    of rotation for ``retry_after`` seconds and then tried again, while the
+    pool's pre-ping keeps dead connections from being handed out at all.
+    """
+
+    def __init__(self, pools, retry_after=5.0):
+        self.pools = list(pools)
+        self.retry_after = retry_after
+        self._down_until = [0.0] * len(self.pools)
+        self._turn = itertools.count()
+        self._failures = 0
+
+    def __bool__(self):
+        return bool(self.pools)
+
+    def candidates(self):
+        """Healthy replica pools, starting with the next one in round-robin order"""
+        if not self.pools:
+            return []
+        now = time.monotonic()
+        count = len(self.pools)
+        first = next(self._turn) % count
+        return [
+            self.pools[i % count] for i in range(first, first + count)
+            if self._down_until[i % count] <= now
+        ]
+
+    def mark_down(self, pool):
+        self._down_until[self.pools.index(pool)] = time.monotonic() + self.retry_after
+        self._failures += 1
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "replicas": len(self.pools),
+            "healthy": sum(1 for until in self._down_until if until <= now),
+            "failures": self._failures,
+            **{f"reads_{target}": count for target, count in routed.items()},
+        }
+
+
+def record_write():
+    """Pin the current client's reads to the primary for the sticky window"""
+    state = _last_write.get()
+    if state is not None:
+        state[0] = time.time()
+
+
+def prefer_primary(sticky_seconds):
+    """Whether the current client wrote recently enough that replicas may be behind"""
+    state = _last_write.get()
+    return state is not None and time.time() - state[0] < sticky_seconds
+
+
+def _cookie_value(headers):
+    for name, value in headers:
+        if name == b"cookie":
+            morsel = SimpleCookie(value.decode("latin-1")).get(STICKY_COOKIE)
+            if morsel is not None:
+                try:
+                    return float(morsel.value)
+                except ValueError:
+                    return 0.0
+    return 0.0
+
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware carrying the client's last write time between requests in a cookie"""
+
+    def __init__(self, app, sticky_seconds):
+        self.app = app
+        self.sticky_seconds = sticky_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        previous = _cookie_value(scope["headers"])
+        state = [previous]
+        token = _last_write.set(state)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and state[0] > previous:
+                cookie = f"{STICKY_COOKIE}={state[0]:.3f}; Max-Age={int(self.sticky_seconds) + 1}; Path=/; HttpOnly; SameSite=Lax"
+                message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", cookie.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _last_write.reset(token)
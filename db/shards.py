@@ -0,0 +1,481 @@
+"""Account-number sharding for account and the tables keyed off it (SHARDED_TABLES).
+
+Shard 0 is the main database (DB_HOST/DB_NAME), which also keeps every other
+table and the account_shard range directory; DB_SHARD_HOSTS adds more. With
+the "range" strategy each directory row sends [range_start, range_end) to a
+shard and numbers outside every row stay on shard 0; "hash" spreads account
+numbers by modulo and cannot be rebalanced. Without DB_SHARD_HOSTS every
+helper resolves to the main pool and the directory is never read.
+
+Run ``python -m db.shards prepare`` once per shard set: it migrates every
+shard and drops the foreign keys that would cross shards (loan_payment to
+account everywhere, depositor to customer on the extra shards only), which
+the handlers check themselves.
+``python -m db.shards rebalance --start S --end E --to N`` then moves a range.
+"""
+import asyncio
+import bisect
+import heapq
+import time
+from contextlib import asynccontextmanager
+from functools import partial
+from operator import itemgetter
+import mysql.connector
+from mysql.connector import Error
+from mysql.connector.aio import connect
+from fastapi import HTTPException
+from db.pool import PoolTimeout
+from db.database import (
+    DB_HOST, DB_USER, DB_PASSWORD, DB_NAME,
+    DB_SHARD_HOSTS, DB_SHARD_STRATEGY, DB_SHARD_MAP_TTL
+)
+from db.async_database import pool, create_pool, execute_read_query, stream_query
+
+# Child tables first so deletes never trip a foreign key
+SHARDED_TABLES = ("depositor", "savings_account", "checking_account", "transaction", "balance_checkpoint", "account")
+
+# (table, column, referenced table, dropped on shard 0) of foreign keys that would point across shards;
+# customer lives on shard 0, so depositor rows there keep their key
+CROSS_SHARD_KEYS = [
+    ("depositor", "customer_id", "customer", False),
+    ("loan_payment", "account_number", "account", True),
+]
+
+def parse_shard(spec):
+    """Connection settings for a host[:port][/database] entry"""
+    address, _, database = spec.partition("/")
+    host, _, port = address.partition(":")
+    return {"host": host, "port": int(port) if port else 3306, "database": database or DB_NAME}
+
+SHARDS = [{"host": DB_HOST, "port": 3306, "database": DB_NAME}] + [parse_shard(spec) for spec in DB_SHARD_HOSTS]
+
+async def _connect(host, port, database):
+    """Open a new asyncio connection to a shard"""
+    return await connect(host=host, port=port, user=DB_USER, password=DB_PASSWORD, database=database)
+
+
+class ShardRouter:
+    """Maps account numbers to shard pools, caching the range directory for ``map_ttl`` seconds"""
+
+    def __init__(self, pools, strategy="range", map_ttl=5.0):
+        self.pools = pools
+        self.strategy = strategy
+        self.map_ttl = map_ttl
+        self._ranges = []
+        self._starts = []
+        self._loaded_at = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self.pools)
+
+    def _expired(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.map_ttl
+
+    async def _directory(self):
+        """(range_start, range_end, shard, moving) rows, reloaded from shard 0 once they expire"""
+        if not self._expired():
+            return self._ranges
+        async with self._lock:
+            if self._expired():
+                try:
+                    # Straight from the primary; a lagging replica could miss a rebalance
+                    conn = await self.pools[0].acquire()
+                    try:
+                        cursor = await conn.cursor()
+                        try:
+                            await cursor.execute(
+                                "SELECT range_start, range_end, shard, moving FROM account_shard ORDER BY range_start"
+                            )
+                            rows = await cursor.fetchall()
+                        finally:
+                            await cursor.close()
+                    finally:
+                        await conn.close()
+                except PoolTimeout as e:
+                    raise HTTPException(status_code=503, detail=str(e))
+                except Error as e:
+                    raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+                self._ranges = [(start, end, shard, bool(moving)) for start, end, shard, moving in rows]
+                self._starts = [row[0] for row in self._ranges]
+                self._loaded_at = time.monotonic()
+        return self._ranges
+
+    async def locate(self, account_number):
+        """(shard, moving) for an account number; moving means its range is being rebalanced"""
+        if len(self.pools) == 1:
+            return 0, False
+        if self.strategy == "hash":
+            return account_number % len(self.pools), False
+        ranges = await self._directory()
+        i = bisect.bisect_right(self._starts, account_number) - 1
+        if i >= 0 and account_number < ranges[i][1]:
+            return ranges[i][2], ranges[i][3]
+        return 0, False
+
+    async def shards_after(self, after):
+        """Shards that may hold account numbers greater than ``after``"""
+        if len(self.pools) == 1 or self.strategy == "hash":
+            return list(range(len(self.pools)))
+        ranges = await self._directory()
+        # Numbers outside every range live on shard 0
+        return sorted({0} | {shard for _, end, shard, _ in ranges if end - 1 > after})
+
+    async def group(self, account_numbers):
+        """{shard: [account numbers]} for a batch of account numbers"""
+        groups = {}
+        for account_number in account_numbers:
+            shard, _ = await self.locate(account_number)
+            groups.setdefault(shard, []).append(account_number)
+        return groups
+
+    def stats(self):
+        return {
+            "shards": len(self.pools),
+            "strategy": self.strategy,
+            "ranges": len(self._ranges),
+            "moving": sum(1 for row in self._ranges if row[3]),
+        }
+
+
+router = ShardRouter(
+    [pool] + [create_pool(partial(_connect, **shard)) for shard in SHARDS[1:]],
+    strategy=DB_SHARD_STRATEGY,
+    map_ttl=DB_SHARD_MAP_TTL
+)
+
+async def _acquire(shard):
+    try:
+        return await router.pools[shard].acquire()
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@asynccontextmanager
+async def _shard_connection(shard, connection=None):
+    """Borrow a connection to ``shard``, or use ``connection`` when it already is one to the main database.
+
+    Handlers pass their request connection so shard 0, which is the main pool,
+    never needs a second checkout while the first is still held.
+    """
+    if shard == 0 and connection is not None and connection.pool is pool:
+        yield connection
+        return
+    conn = await _acquire(shard)
+    try:
+        yield conn
+    finally:
+        await conn.close()
+
+@asynccontextmanager
+async def borrow_shard(account_number, write=False, connection=None):
+    """Borrow a connection to the shard holding ``account_number``; writes are refused mid-rebalance"""
+    shard, moving = await router.locate(account_number)
+    if write and moving:
+        raise HTTPException(status_code=503, detail="Account range is being rebalanced, retry shortly")
+    async with _shard_connection(shard, connection) as conn:
+        yield conn
+
+@asynccontextmanager
+async def borrow_shard_connection(shard):
+    """Borrow a connection to a shard by index, for jobs that walk every shard"""
+    async with _shard_connection(shard) as conn:
+        yield conn
+
+async def execute_shard_read_query(shard, query, params=None, connection=None):
+    """execute_read_query on one shard, reusing ``connection`` for shard 0"""
+    async with _shard_connection(shard, connection) as conn:
+        return await execute_read_query(conn, query, params)
+
+async def execute_fan_out_query(query, params=None, key=None, limit=None, after=None, connection=None):
+    """Run a read on every shard concurrently and merge the rows.
+
+    With ``key`` each shard's rows must already be sorted on it and the
+    merge keeps that order; ``limit`` truncates the merged rows and ``after``
+    skips shards whose ranges all end at or before that key. Shard 0 reuses
+    ``connection`` when given, which must then not be in use elsewhere.
+    """
+    shards = await router.shards_after(after) if after is not None else list(range(len(router)))
+    results = await asyncio.gather(*[
+        execute_shard_read_query(shard, query, params, connection) for shard in shards
+    ])
+    if key is not None:
+        rows = list(heapq.merge(*results, key=itemgetter(key)))
+    else:
+        rows = [row for shard_rows in results for row in shard_rows]
+    return rows if limit is None else rows[:limit]
+
+async def existing_accounts(account_numbers, connection=None):
+    """The account numbers that exist, with one IN query per shard (shard 0 on ``connection`` when given)"""
+    async def present(shard, numbers):
+        query = f"SELECT account_number FROM account WHERE account_number IN ({', '.join(['%s'] * len(numbers))})"
+        return await execute_shard_read_query(shard, query, tuple(numbers), connection)
+
+    groups = await router.group(sorted(set(account_numbers)))
+    results = await asyncio.gather(*[present(shard, numbers) for shard, numbers in groups.items()])
+    return {row["account_number"] for rows in results for row in rows}
+
+async def _chain(streams):
+    try:
+        for stream in streams:
+            async for batch in stream:
+                yield batch
+    finally:
+        for stream in streams:
+            await stream.aclose()
+
+async def stream_shards(query, params=None, batch_size=1000):
+    """stream_query on every shard, all started before any row is sent; rows are ordered within each shard only"""
+    streams = []
+    try:
+        for shard in range(len(router)):
+            source = None if shard == 0 else router.pools[shard]
+            streams.append(await stream_query(query, params, batch_size, source))
+    except BaseException:
+        for stream in streams:
+            await stream.aclose()
+        raise
+    return _chain(streams)
+
+def _connect_sync(shard):
+    """Blocking connection to a shard for the maintenance commands, creating its database if needed"""
+    connection = mysql.connector.connect(
+        host=shard["host"], port=shard["port"], user=DB_USER, password=DB_PASSWORD
+    )
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {shard['database']}")
+    finally:
+        cursor.close()
+    connection.database = shard["database"]
+    return connection
+
+def _foreign_keys(cursor, table, column, referenced):
+    cursor.execute("""
+    SELECT CONSTRAINT_NAME FROM information_schema.KEY_COLUMN_USAGE
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s AND REFERENCED_TABLE_NAME = %s
+    """, (table, column, referenced))
+    return [name for (name,) in cursor.fetchall()]
+
+def _drop_cross_shard_keys(connection, main):
+    """Drop the foreign keys that would cross shards; on ``main`` restore the ones it keeps"""
+    cursor = connection.cursor()
+    changed = []
+    try:
+        for table, column, referenced, dropped_on_main in CROSS_SHARD_KEYS:
+            names = _foreign_keys(cursor, table, column, referenced)
+            if main and not dropped_on_main:
+                # Earlier versions dropped it on shard 0 as well
+                if not names:
+                    cursor.execute(f"ALTER TABLE {table} ADD FOREIGN KEY ({column}) REFERENCES {referenced}({column})")
+                    changed.append(f"{table}.{column} restored")
+                continue
+            for name in names:
+                cursor.execute(f"ALTER TABLE {table} DROP FOREIGN KEY {name}")
+                changed.append(f"{table}.{name} dropped")
+    finally:
+        cursor.close()
+    return changed
+
+def prepare():
+    """Migrate every shard and drop the foreign keys that would cross shards"""
+    from db.migrations import apply_migrations
+
+    report = []
+    for index, shard in enumerate(SHARDS):
+        connection = _connect_sync(shard)
+        try:
+            applied = apply_migrations(connection)
+            changed = _drop_cross_shard_keys(connection, main=index == 0)
+        finally:
+            connection.close()
+        report.append({"shard": index, **shard, "migrations_applied": applied, "foreign_keys": changed})
+    return report
+
+def _read_directory(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT range_start, range_end, shard, moving FROM account_shard ORDER BY range_start")
+        return [(start, end, shard, bool(moving)) for start, end, shard, moving in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+def _write_directory(connection, ranges):
+    cursor = connection.cursor()
+    try:
+        cursor.execute("DELETE FROM account_shard")
+        if ranges:
+            cursor.executemany(
+                "INSERT INTO account_shard (range_start, range_end, shard, moving) VALUES (%s, %s, %s, %s)",
+                sorted(ranges)
+            )
+        connection.commit()
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def _carve(ranges, start, end):
+    """Split the directory into rows outside [start, end) and rows exactly covering it.
+
+    Gaps inside [start, end) are filled with explicit shard 0 rows, since
+    that is where numbers outside every range live.
+    """
+    outside, inside = [], []
+    for row_start, row_end, shard, moving in ranges:
+        if row_end <= start or row_start >= end:
+            outside.append((row_start, row_end, shard, moving))
+            continue
+        if row_start < start:
+            outside.append((row_start, start, shard, moving))
+        if row_end > end:
+            outside.append((end, row_end, shard, moving))
+        inside.append((max(row_start, start), min(row_end, end), shard, moving))
+
+    covering = []
+    position = start
+    for row in sorted(inside):
+        if row[0] > position:
+            covering.append((position, row[0], 0, False))
+        covering.append(row)
+        position = row[1]
+    if position < end:
+        covering.append((position, end, 0, False))
+    return outside, covering
+
+def _copy_range(source, target, start, end, chunk_size):
+    """Copy the account rows in [start, end) from one shard to another; returns the accounts copied"""
+    reader = source.cursor()
+    writer = target.cursor()
+    copied = 0
+    try:
+        # Parents first on the way in
+        for table in reversed(SHARDED_TABLES):
+            reader.execute(f"SELECT * FROM `{table}` WHERE account_number >= %s AND account_number < %s", (start, end))
+            columns = reader.column_names
+            # Upsert so a re-run after an interrupted copy converges instead of failing
+            insert = (
+                f"INSERT INTO `{table}` ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+                f"ON DUPLICATE KEY UPDATE {', '.join(f'{column} = VALUES({column})' for column in columns)}"
+            )
+            while True:
+                rows = reader.fetchmany(chunk_size)
+                if not rows:
+                    break
+                writer.executemany(insert, rows)
+                if table == "account":
+                    copied += len(rows)
+
+        # Interest chunks already accrued for these accounts must stay done on the target;
+        # the copies carry no totals so progress() still counts each account once
+        reader.execute("""
+        SELECT run_id, range_start, range_end, days, 0 AS accounts, 0 AS interest_total, finished_at
+        FROM interest_accrual WHERE range_start < %s AND range_end > %s
+        """, (end, start))
+        columns = reader.column_names
+        rows = reader.fetchall()
+        if rows:
+            writer.executemany(
+                f"INSERT IGNORE INTO interest_accrual ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+                rows
+            )
+        target.commit()
+    except Error:
+        target.rollback()
+        raise
+    finally:
+        reader.close()
+        writer.close()
+    return copied
+
+def _delete_range(connection, start, end, chunk_size):
+    cursor = connection.cursor()
+    try:
+        for table in SHARDED_TABLES:
+            while True:
+                cursor.execute(
+                    f"DELETE FROM `{table}` WHERE account_number >= %s AND account_number < %s LIMIT {int(chunk_size)}",
+                    (start, end)
+                )
+                connection.commit()
+                if cursor.rowcount < chunk_size:
+                    break
+    finally:
+        cursor.close()
+
+def rebalance(start, end, target, pause=DB_SHARD_MAP_TTL + 1, chunk_size=5000):
+    """Move every account in [start, end) to shard ``target``; safe to re-run if interrupted.
+
+    Writes to the range are refused while it is marked moving, and each
+    directory change waits ``pause`` seconds so every worker's cached copy
+    has expired before the next step.
+    """
+    if DB_SHARD_STRATEGY != "range":
+        raise SystemExit("Only the range strategy can be rebalanced")
+    if not 0 <= target < len(SHARDS):
+        raise SystemExit(f"Unknown shard {target}; configured shards are 0-{len(SHARDS) - 1}")
+    if start >= end:
+        raise SystemExit("--start must be below --end")
+
+    connections = {}
+
+    def connection_for(shard):
+        if shard not in connections:
+            connections[shard] = _connect_sync(SHARDS[shard])
+        return connections[shard]
+
+    try:
+        directory = connection_for(0)
+        outside, covering = _carve(_read_directory(directory), start, end)
+        sources = sorted({shard for _, _, shard, _ in covering if shard != target})
+
+        # Block writes to the range and let every worker see that
+        _write_directory(directory, outside + [(s, e, shard, True) for s, e, shard, _ in covering])
+        time.sleep(pause)
+
+        moved = 0
+        for source in sources:
+            moved += _copy_range(connection_for(source), connection_for(target), start, end, chunk_size)
+
+        # Point the range at the target and let readers switch before the originals go
+        _write_directory(directory, outside + [(start, end, target, False)])
+        time.sleep(pause)
+
+        for source in sources:
+            _delete_range(connection_for(source), start, end, chunk_size)
+        return {"range": [start, end], "target": target, "sources": sources, "accounts_moved": moved}
+    finally:
+        for connection in connections.values():
+            connection.close()
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Account shard maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("prepare", help="Migrate every shard and drop cross-shard foreign keys")
+    commands.add_parser("map", help="Print the range directory")
+    move = commands.add_parser("rebalance", help="Move the accounts in [start, end) to another shard")
+    move.add_argument("--start", type=int, required=True)
+    move.add_argument("--end", type=int, required=True, help="Exclusive upper bound")
+    move.add_argument("--to", type=int, required=True, dest="target", help="Destination shard index")
+    move.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.command == "prepare":
+        result = prepare()
+    elif args.command == "map":
+        db_connection = _connect_sync(SHARDS[0])
+        try:
+            result = [
+                {"range_start": s, "range_end": e, "shard": shard, "moving": moving}
+                for s, e, shard, moving in _read_directory(db_connection)
+            ]
+        finally:
+            db_connection.close()
+    else:
+        result = rebalance(args.start, args.end, args.target, chunk_size=args.chunk_size)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,45 @@
+from collections import OrderedDict
+
+# Totals across every connection's cache, for stats endpoints and benchmarks
+totals = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+class StatementCache:
+    """Bounded LRU of prepared cursors for one connection, keyed by SQL text.
+
+    The cache only does the bookkeeping; callers decide what to store per
+    statement (the helpers keep the SQL object with its cursor) and close
+    whatever ``put`` evicts. It lives and dies with its pool entry, which
+    means a reconnected or recycled connection starts empty and re-prepares
+    lazily.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._cursors = OrderedDict()
+
+    def get(self, sql):
+        cursor = self._cursors.get(sql)
+        if cursor is None:
+            totals["misses"] += 1
+            return None
+        totals["hits"] += 1
+        self._cursors.move_to_end(sql)
+        return cursor
+
+    def put(self, sql, cursor):
+        """Cache a freshly prepared cursor and return the entries evicted to make room"""
+        self._cursors[sql] = cursor
+        evicted = []
+        while len(self._cursors) > self.capacity:
+            _, old = self._cursors.popitem(last=False)
+            evicted.append(old)
+            totals["evictions"] += 1
+        return evicted
+
+    def discard(self, sql):
+        """Drop a cursor that failed mid-statement; returns it so the caller can close it"""
+        return self._cursors.pop(sql, None)
+
+    def __len__(self):
+        return len(self._cursors)
@@ -1,6 +1,13 @@
 from fastapi import FastAPI
-import uvicorn
+from fastapi.responses import PlainTextResponse
 from config import API_TITLE, API_DESCRIPTION, API_VERSION
+from db.async_database import pool, replicas
+from db.database import DB_REPLICA_STICKY_SECONDS
+from db.replicas import ReadYourWritesMiddleware
+from db.shards import router as shard_router
+from db.cache import cache
+from db import diagnostics, idempotency, statements
+import metrics
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -9,18 +16,66 @@ app = FastAPI(
     version=API_VERSION
 )
 
+# Per-route latency, status and statement counts for /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Keep a client's reads on the primary for a short window after it writes
+if replicas:
+    app.add_middleware(ReadYourWritesMiddleware, sticky_seconds=DB_REPLICA_STICKY_SECONDS)
+
+# Opt-in slow-query log and redundant-query detector (DB_DIAGNOSTICS=1)
+if diagnostics.enabled:
+    app.add_middleware(diagnostics.DiagnosticsMiddleware)
+
 # Import and include routers
-from routers import customers, accounts, employees, loans, payments
+from routers import customers, accounts, employees, loans, payments, branches, admin
 
 app.include_router(customers.router)
 app.include_router(accounts.router)
 app.include_router(employees.router)
 app.include_router(loans.router)
 app.include_router(payments.router)
+app.include_router(branches.router)
+app.include_router(admin.router)
 
 @app.get("/")
 async def read_root():
     return {"message": "Welcome to Banking System API"}
 
+@app.get("/db/pool")
+async def get_pool_stats():
+    """Connection pool occupancy, checkout latency, prepared-statement cache, replica and shard counters"""
+    return {
+        **pool.stats(),
+        "statement_cache": dict(statements.totals),
+        "replicas": {**replicas.stats(), "pools": [replica_pool.stats() for replica_pool in replicas.pools]},
+        "shards": {**shard_router.stats(), "pools": [shard_pool.stats() for shard_pool in shard_router.pools[1:]]},
+    }
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Entity cache hit, miss and eviction counters"""
+    return cache.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    """Prometheus text exposition of request, statement, pool and cache metrics"""
+    return metrics.render([
+        metrics.gauges("db_pool", pool.stats()),
+        metrics.gauges("db_statement_cache", statements.totals),
+        metrics.gauges("db_replicas", replicas.stats()),
+        metrics.gauges("db_shards", shard_router.stats()),
+        metrics.gauges("entity_cache", cache.stats()),
+        metrics.gauges("idempotency", idempotency.stats()),
+    ])
+
+@app.on_event("shutdown")
+async def close_pool():
+    await pool.dispose()
+    for extra_pool in replicas.pools + shard_router.pools[1:]:
+        await extra_pool.dispose()
+
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
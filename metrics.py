@@ -0,0 +1,195 @@
+import re
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from starlette.routing import Match
+
+# Latency buckets in seconds, shared by request and statement histograms
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+
+    def inc(self, labels=(), amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            # Per-bucket (non-cumulative) counts, then sum and count
+            series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(self.labelnames + ("le",), labels + (str(bound),))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            inf_labels = _format_labels(self.labelnames + ("le",), labels + ("+Inf",))
+            lines.append(f"{self.name}_bucket{inf_labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _gauge(name, documentation, value, labels=""):
+    return [f"# HELP {name} {documentation}", f"# TYPE {name} gauge", f"{name}{labels} {value}"]
+
+
+request_latency = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route")
+)
+request_count = Counter(
+    "http_requests_total", "HTTP responses by route and status code", ("method", "route", "status")
+)
+request_queries = Histogram(
+    "http_request_db_queries", "Database statements issued per request", ("method", "route"), COUNT_BUCKETS
+)
+query_latency = Histogram(
+    "db_query_duration_seconds", "Statement latency by operation and table", ("operation", "table")
+)
+query_rows = Counter(
+    "db_query_rows_total", "Rows returned or affected by operation and table", ("operation", "table")
+)
+query_errors = Counter(
+    "db_query_errors_total", "Failed statements by operation and table", ("operation", "table")
+)
+deposit_batch_size = Histogram(
+    "deposit_batch_size", "Deposits applied per group commit", buckets=COUNT_BUCKETS
+)
+
+REGISTRY = [request_latency, request_count, request_queries, query_latency, query_rows, query_errors, deposit_batch_size]
+
+# Number of statements run by the current request; None outside a request
+_request_queries = ContextVar("request_queries", default=None)
+
+_TABLE_PATTERN = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+`?(\w+)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def _statement_labels(query):
+    """(operation, table) for a SQL string, e.g. ("select", "customer")"""
+    stripped = query.lstrip()
+    operation = stripped.split(None, 1)[0].lower() if stripped else "unknown"
+    match = _TABLE_PATTERN.search(stripped)
+    return operation, match.group(1).lower() if match else "none"
+
+
+def observe_query(query, elapsed, rows=None, failed=False):
+    """Hook called by the execute_* helpers after every statement"""
+    labels = _statement_labels(query)
+    query_latency.observe(labels, elapsed)
+    if failed:
+        query_errors.inc(labels)
+    elif rows and rows > 0:
+        # The driver reports -1 when it has no count
+        query_rows.inc(labels, rows)
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and statement count per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+        queries = [0]
+        token = _request_queries.set(queries)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_queries.reset(token)
+            route = _route_template(scope)
+            labels = (scope["method"], route)
+            request_latency.observe(labels, elapsed)
+            request_count.inc((scope["method"], route, str(status[0])))
+            request_queries.observe(labels, queries[0])
+
+
+def _route_template(scope):
+    """Path template such as /customers/{customer_id}, keeping label cardinality bounded"""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    app = scope.get("app")
+    for candidate in getattr(app, "routes", ()):
+        match, _ = candidate.matches(scope)
+        if match == Match.FULL:
+            return candidate.path
+    return "unmatched"
+
+
+def render(extra_sections=()):
+    """Prometheus text exposition of every registered metric plus extra gauge sections"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose())
+    for section in extra_sections:
+        lines.extend(section)
+    return "\n".join(lines) + "\n"
+
+
+def gauges(prefix, stats):
+    """Gauge lines for every numeric value of a stats dict, e.g. pool or cache stats"""
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        lines.extend(_gauge(f"{prefix}_{key}", f"{prefix} {key.replace('_', ' ')}", value))
+    return lines
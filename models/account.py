@@ -1,6 +1,8 @@
 from pydantic import BaseModel, Field
 from typing import Optional
 from decimal import Decimal
+from datetime import date, datetime
+from models.pagination import Page
 
 class AccountBase(BaseModel):
     balance: Decimal = Field(..., example="1000.00")
@@ -36,4 +38,25 @@ class CheckingAccount(CheckingAccountBase):
     account_number: int = Field(..., example=1002)
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class StatementLine(BaseModel):
+    payment_number: int = Field(..., example=7001)
+    payment_date: date = Field(..., example="2023-04-15")
+    payment_amount: Decimal = Field(..., example="250.00")
+    loan_number: int = Field(..., example=5001)
+
+class AccountStatement(Page[StatementLine]):
+    account_number: int = Field(..., example=1001)
+    balance: Decimal = Field(..., example="1000.00")
+    from_date: Optional[date] = Field(None, example="2023-01-01")
+    to_date: Optional[date] = Field(None, example="2023-12-31")
+    payment_count: int = Field(..., example=12)
+    total_paid: Decimal = Field(..., example="3000.00")
+
+class AccountBalance(BaseModel):
+    account_number: int = Field(..., example=1001)
+    as_of: datetime = Field(..., example="2023-06-30T23:59:59")
+    balance: Decimal = Field(..., example="1250.00")
+    checkpoint_as_of: datetime = Field(..., example="2023-06-28T10:15:00")
+    entries_scanned: int = Field(..., example=3)
\ No newline at end of file
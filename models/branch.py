@@ -12,4 +12,22 @@ class BranchCreate(BranchBase):
 
 class Branch(BranchBase):
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class BranchSummary(BaseModel):
+    branch_name: str = Field(..., example="Main Branch")
+    branch_city: Optional[str] = Field(None, example="Chicago")
+    loan_count: int = Field(..., example=120)
+    loan_total: Decimal = Field(..., example="1500000.00")
+    average_loan: Optional[Decimal] = Field(None, example="12500.00")
+    total_paid: Decimal = Field(..., example="300000.00")
+    outstanding: Decimal = Field(..., example="1200000.00")
+
+class CitySummary(BaseModel):
+    branch_city: Optional[str] = Field(None, example="Chicago")
+    branch_count: int = Field(..., example=3)
+    loan_count: int = Field(..., example=360)
+    loan_total: Decimal = Field(..., example="4500000.00")
+    average_loan: Optional[Decimal] = Field(None, example="12500.00")
+    total_paid: Decimal = Field(..., example="900000.00")
+    outstanding: Decimal = Field(..., example="3600000.00")
\ No newline at end of file
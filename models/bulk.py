@@ -0,0 +1,12 @@
+from pydantic import BaseModel, Field
+from typing import Generic, Optional, TypeVar
+
+MAX_BULK_ITEMS = 10000
+
+T = TypeVar("T")
+
+class BulkItemResult(BaseModel, Generic[T]):
+    index: int = Field(..., example=0)
+    status: str = Field(..., example="created")
+    item: Optional[T] = None
+    detail: Optional[str] = Field(None, example="Loan not found")
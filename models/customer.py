@@ -1,5 +1,8 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Literal, Optional
+from decimal import Decimal
+from datetime import date
+from models.loan import LoanWithBalance
 
 class CustomerBase(BaseModel):
     customer_name: str = Field(..., example="John Doe")
@@ -13,4 +16,24 @@ class Customer(CustomerBase):
     customer_id: int = Field(..., example=1)
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class PortfolioAccount(BaseModel):
+    account_number: int = Field(..., example=1001)
+    balance: Decimal = Field(..., example="1000.00")
+    account_type: Optional[Literal["savings", "checking"]] = Field(None, example="savings")
+    interest_rate: Optional[Decimal] = Field(None, example="2.50")
+    overdraft_amount: Optional[Decimal] = Field(None, example=None)
+    access_date: Optional[date] = Field(None, example="2023-04-15")
+
+class PortfolioPayment(BaseModel):
+    payment_number: int = Field(..., example=7001)
+    payment_date: date = Field(..., example="2023-04-15")
+    payment_amount: Decimal = Field(..., example="250.00")
+    loan_number: int = Field(..., example=5001)
+    account_number: int = Field(..., example=1001)
+
+class CustomerPortfolio(Customer):
+    accounts: List[PortfolioAccount] = []
+    loans: List[LoanWithBalance] = []
+    recent_payments: List[PortfolioPayment] = []
\ No newline at end of file
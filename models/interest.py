@@ -0,0 +1,19 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from decimal import Decimal
+from datetime import datetime
+
+class InterestAccrualCreate(BaseModel):
+    run_id: str = Field(..., max_length=40, example="2024-06-30")
+    days: int = Field(1, ge=1, le=366, example=30)
+    chunk_size: Optional[int] = Field(None, ge=1, example=10000)
+    concurrency: int = Field(1, ge=1, le=16, example=4)
+
+class InterestAccrualRun(BaseModel):
+    run_id: str = Field(..., example="2024-06-30")
+    running: bool = Field(..., example=False)
+    chunks: int = Field(..., example=50)
+    accounts: int = Field(..., example=480000)
+    interest_total: Decimal = Field(..., example="1523344.18")
+    last_finished_at: Optional[datetime] = None
+    error: Optional[str] = None
\ No newline at end of file
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from typing import Optional
 from decimal import Decimal
+from datetime import date
 
 class LoanBase(BaseModel):
     amount: Decimal = Field(..., example="10000.00")
@@ -14,6 +15,12 @@ class Loan(LoanBase):
     class Config:
         orm_mode = True
 
+class LoanWithBalance(Loan):
+    total_paid: Optional[Decimal] = Field(None, example="2500.00")
+    outstanding: Optional[Decimal] = Field(None, example="7500.00")
+    last_payment_date: Optional[date] = Field(None, example="2023-04-15")
+    payment_count: Optional[int] = Field(None, example=10)
+
 class BorrowerCreate(BaseModel):
     customer_id: int = Field(..., example=1)
     loan_number: int = Field(..., example=5001)
@@ -0,0 +1,20 @@
+from pydantic import BaseModel, Field
+from typing import Generic, List, Optional, TypeVar
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+T = TypeVar("T")
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[int] = Field(None, example=1100)
+
+def page_of(rows, limit, key):
+    """Build a Page from rows fetched with LIMIT limit + 1, keyed on ``key``"""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "items": rows,
+        "next_cursor": rows[-1][key] if has_more else None
+    }
@@ -1,8 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
-from db.database import get_db_connection, execute_read_query, execute_read_single_query, execute_write_query
-from models.account import Account, AccountCreate, SavingsAccount, SavingsAccountCreate, CheckingAccount, CheckingAccountCreate
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from typing import Literal, Optional
+from db.async_database import get_db, execute_read_query, execute_read_single_query, execute_write_query, execute_update_query, transaction
+from db.ids import allocator
+from db.export import export_response
+from db.shards import borrow_shard, execute_fan_out_query
+from db.journal import record_entry, balance_as_of
+from db import idempotency
+from db.group_commit import deposit_batcher, CENT
+from models.account import Account, AccountCreate, SavingsAccount, SavingsAccountCreate, CheckingAccount, CheckingAccountCreate, AccountStatement, AccountBalance
+from models.pagination import Page, page_of, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from decimal import Decimal
+from datetime import date, datetime
+
+# Bounds of MySQL's DATE type, used when a statement range is open-ended
+STATEMENT_START = date(1000, 1, 1)
+STATEMENT_END = date(9999, 12, 31)
+
+def _cents(amount, kind):
+    """Amount as a Decimal, rejected unless it is a whole number of cents of at least one cent"""
+    value = Decimal(str(amount))
+    # Anything finer would be rounded by the DECIMAL(..., 2) columns, possibly to nothing
+    if not value.is_finite() or value < CENT or value.as_tuple().exponent < -2:
+        raise HTTPException(
+            status_code=400, detail=f"{kind} amount must be at least 0.01 with at most 2 decimal places"
+        )
+    return value
 
 router = APIRouter(
     prefix="/accounts",
@@ -10,166 +32,305 @@ router = APIRouter(
     responses={404: {"description": "Not found"}}
 )
 
-@router.get("/", response_model=List[Account])
-def get_all_accounts():
-    conn = get_db_connection()
-    try:
-        query = "SELECT * FROM account"
-        accounts = execute_read_query(conn, query)
-        return accounts
-    finally:
-        conn.close()
-
-@router.get("/savings", response_model=List[SavingsAccount])
-def get_savings_accounts():
-    conn = get_db_connection()
-    try:
-        query = """
-        SELECT a.account_number, a.balance, s.interest_rate
-        FROM account a
-        JOIN savings_account s ON a.account_number = s.account_number
-        """
-        accounts = execute_read_query(conn, query)
-        return accounts
-    finally:
-        conn.close()
-
-@router.get("/checking", response_model=List[CheckingAccount])
-def get_checking_accounts():
-    conn = get_db_connection()
-    try:
-        query = """
-        SELECT a.account_number, a.balance, c.overdraft_amount
-        FROM account a
-        JOIN checking_account c ON a.account_number = c.account_number
-        """
-        accounts = execute_read_query(conn, query)
-        return accounts
-    finally:
-        conn.close()
+@router.get("/", response_model=Page[Account])
+async def get_all_accounts(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = Query(None, description="Return rows after this account_number")
+):
+    query = "SELECT account_number, balance FROM account WHERE account_number > %s ORDER BY account_number LIMIT %s"
+    # Each shard returns its first limit + 1 rows after the cursor; merge them in key order
+    accounts = await execute_fan_out_query(
+        query, (after or 0, limit + 1), key="account_number", limit=limit + 1, after=after or 0
+    )
+    return page_of(accounts, limit, "account_number")
+
+@router.get("/export")
+async def export_accounts(fmt: Literal["ndjson", "csv"] = Query("ndjson", alias="format")):
+    query = "SELECT account_number, balance FROM account ORDER BY account_number"
+    return await export_response(query, "accounts", fmt, sharded=True)
+
+@router.get("/savings", response_model=Page[SavingsAccount])
+async def get_savings_accounts(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = Query(None, description="Return rows after this account_number")
+):
+    query = """
+    SELECT a.account_number, a.balance, s.interest_rate
+    FROM savings_account s
+    JOIN account a ON a.account_number = s.account_number
+    WHERE s.account_number > %s
+    ORDER BY s.account_number
+    LIMIT %s
+    """
+    # Each shard returns its first limit + 1 rows after the cursor; merge them in key order
+    accounts = await execute_fan_out_query(
+        query, (after or 0, limit + 1), key="account_number", limit=limit + 1, after=after or 0
+    )
+    return page_of(accounts, limit, "account_number")
+
+@router.get("/checking", response_model=Page[CheckingAccount])
+async def get_checking_accounts(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = Query(None, description="Return rows after this account_number")
+):
+    query = """
+    SELECT a.account_number, a.balance, c.overdraft_amount
+    FROM checking_account c
+    JOIN account a ON a.account_number = c.account_number
+    WHERE c.account_number > %s
+    ORDER BY c.account_number
+    LIMIT %s
+    """
+    # Each shard returns its first limit + 1 rows after the cursor; merge them in key order
+    accounts = await execute_fan_out_query(
+        query, (after or 0, limit + 1), key="account_number", limit=limit + 1, after=after or 0
+    )
+    return page_of(accounts, limit, "account_number")
 
 @router.post("/savings", response_model=SavingsAccount, status_code=status.HTTP_201_CREATED)
-def create_savings_account(account: SavingsAccountCreate, customer_id: int):
-    conn = get_db_connection()
-    try:
-        # Verify customer exists
-        customer_query = "SELECT * FROM customer WHERE customer_id = %s"
-        customer = execute_read_single_query(conn, customer_query, (customer_id,))
-        if not customer:
-            raise HTTPException(status_code=404, detail="Customer not found")
-        
-        # Get next available account_number
-        query = "SELECT MAX(account_number) as max_id FROM account"
-        result = execute_read_single_query(conn, query)
-        next_id = 1001 if not result or result["max_id"] is None else result["max_id"] + 1
-        
+async def create_savings_account(account: SavingsAccountCreate, customer_id: int, conn=Depends(get_db)):
+    # Verify customer exists
+    customer_query = "SELECT * FROM customer WHERE customer_id = %s"
+    customer = await execute_read_single_query(conn, customer_query, (customer_id,))
+    if not customer:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    
+    # Reserve next account_number
+    next_id = await allocator.next_id("account", conn)
+    
+    # The account and its depositor link live on the account's shard
+    async with borrow_shard(next_id, write=True, connection=conn) as shard_conn, transaction(shard_conn):
         # Create base account
-        account_query = "INSERT INTO account (account_number, balance) VALUES (%s, %s)"
-        execute_write_query(conn, account_query, (next_id, account.balance))
-        
+        account_query = "INSERT INTO account (account_number, balance, journal_entries) VALUES (%s, %s, 1)"
+        await execute_write_query(shard_conn, account_query, (next_id, account.balance))
+    
         # Create savings account
         savings_query = "INSERT INTO savings_account (account_number, interest_rate) VALUES (%s, %s)"
-        execute_write_query(conn, savings_query, (next_id, account.interest_rate))
-        
+        await execute_write_query(shard_conn, savings_query, (next_id, account.interest_rate))
+    
         # Link account to customer (depositor)
         depositor_query = "INSERT INTO depositor (customer_id, account_number, access_date) VALUES (%s, %s, CURDATE())"
-        execute_write_query(conn, depositor_query, (customer_id, next_id))
+        await execute_write_query(shard_conn, depositor_query, (customer_id, next_id))
         
-        return {
-            "account_number": next_id,
-            "balance": account.balance,
-            "interest_rate": account.interest_rate
-        }
-    finally:
-        conn.close()
+        # Opening balance starts the journal
+        await record_entry(shard_conn, next_id, "opening", account.balance, account.balance, 1)
+    
+    return {
+        "account_number": next_id,
+        "balance": account.balance,
+        "interest_rate": account.interest_rate
+    }
 
 @router.post("/checking", response_model=CheckingAccount, status_code=status.HTTP_201_CREATED)
-def create_checking_account(account: CheckingAccountCreate, customer_id: int):
-    conn = get_db_connection()
-    try:
-        # Verify customer exists
-        customer_query = "SELECT * FROM customer WHERE customer_id = %s"
-        customer = execute_read_single_query(conn, customer_query, (customer_id,))
-        if not customer:
-            raise HTTPException(status_code=404, detail="Customer not found")
-        
-        # Get next available account_number
-        query = "SELECT MAX(account_number) as max_id FROM account"
-        result = execute_read_single_query(conn, query)
-        next_id = 1001 if not result or result["max_id"] is None else result["max_id"] + 1
-        
+async def create_checking_account(account: CheckingAccountCreate, customer_id: int, conn=Depends(get_db)):
+    # Verify customer exists
+    customer_query = "SELECT * FROM customer WHERE customer_id = %s"
+    customer = await execute_read_single_query(conn, customer_query, (customer_id,))
+    if not customer:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    
+    # Reserve next account_number
+    next_id = await allocator.next_id("account", conn)
+    
+    # The account and its depositor link live on the account's shard
+    async with borrow_shard(next_id, write=True, connection=conn) as shard_conn, transaction(shard_conn):
         # Create base account
-        account_query = "INSERT INTO account (account_number, balance) VALUES (%s, %s)"
-        execute_write_query(conn, account_query, (next_id, account.balance))
-        
+        account_query = "INSERT INTO account (account_number, balance, journal_entries) VALUES (%s, %s, 1)"
+        await execute_write_query(shard_conn, account_query, (next_id, account.balance))
+    
         # Create checking account
         checking_query = "INSERT INTO checking_account (account_number, overdraft_amount) VALUES (%s, %s)"
-        execute_write_query(conn, checking_query, (next_id, account.overdraft_amount))
-        
+        await execute_write_query(shard_conn, checking_query, (next_id, account.overdraft_amount))
+    
         # Link account to customer (depositor)
         depositor_query = "INSERT INTO depositor (customer_id, account_number, access_date) VALUES (%s, %s, CURDATE())"
-        execute_write_query(conn, depositor_query, (customer_id, next_id))
+        await execute_write_query(shard_conn, depositor_query, (customer_id, next_id))
         
-        return {
-            "account_number": next_id,
-            "balance": account.balance,
-            "overdraft_amount": account.overdraft_amount
-        }
-    finally:
-        conn.close()
+        # Opening balance starts the journal
+        await record_entry(shard_conn, next_id, "opening", account.balance, account.balance, 1)
+    
+    return {
+        "account_number": next_id,
+        "balance": account.balance,
+        "overdraft_amount": account.overdraft_amount
+    }
 
-@router.post("/{account_number}/deposit")
-def deposit(account_number: int, amount: float):
-    if amount <= 0:
-        raise HTTPException(status_code=400, detail="Deposit amount must be positive")
-    
-    conn = get_db_connection()
-    try:
-        # Check if account exists
-        account_query = "SELECT * FROM account WHERE account_number = %s"
-        account = execute_read_single_query(conn, account_query, (account_number,))
+@router.get("/{account_number}/statement", response_model=AccountStatement)
+async def get_account_statement(
+    account_number: int,
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = Query(None, description="Return payments after this payment_number"),
+    conn=Depends(get_db)
+):
+    if from_date and to_date and from_date > to_date:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+
+    # Balance, range totals and one keyset page of payments in a single round
+    # trip; the totals row is always present, page columns are NULL past the end
+    statement_query = """
+    SELECT (SELECT balance FROM account WHERE account_number = %s) AS balance,
+           t.payment_count, t.total_paid,
+           s.payment_number, s.payment_date, s.payment_amount, s.loan_number
+    FROM (
+        SELECT COUNT(*) AS payment_count, COALESCE(SUM(p.payment_amount), 0) AS total_paid
+        FROM loan_payment lp
+        JOIN payment p ON p.payment_number = lp.payment_number
+        WHERE lp.account_number = %s AND p.payment_date BETWEEN %s AND %s
+    ) t
+    LEFT JOIN (
+        SELECT p.payment_number, p.payment_date, p.payment_amount, lp.loan_number
+        FROM loan_payment lp
+        JOIN payment p ON p.payment_number = lp.payment_number
+        WHERE lp.account_number = %s AND p.payment_date BETWEEN %s AND %s
+          AND (%s IS NULL OR (p.payment_date, p.payment_number) > (
+              SELECT payment_date, payment_number FROM payment WHERE payment_number = %s
+          ))
+        ORDER BY p.payment_date, p.payment_number
+        LIMIT %s
+    ) s ON TRUE
+    ORDER BY s.payment_date, s.payment_number
+    """
+    start, end = from_date or STATEMENT_START, to_date or STATEMENT_END
+    rows = await execute_read_query(conn, statement_query, (
+        account_number,
+        account_number, start, end,
+        account_number, start, end, after, after, limit + 1
+    ))
+
+    balance = rows[0]["balance"]
+    if balance is None:
+        # Not on the main database: the account is missing or lives on another shard
+        async with borrow_shard(account_number, connection=conn) as shard_conn:
+            balance_query = "SELECT balance FROM account WHERE account_number = %s"
+            account = await execute_read_single_query(shard_conn, balance_query, (account_number,))
         if not account:
             raise HTTPException(status_code=404, detail="Account not found")
-        
-        # Update balance
-        new_balance = account["balance"] + Decimal(str(amount))
-        update_query = "UPDATE account SET balance = %s WHERE account_number = %s"
-        execute_write_query(conn, update_query, (new_balance, account_number))
-        
-        return {"message": f"Deposited {amount}. New balance: {new_balance}"}
-    finally:
-        conn.close()
+        balance = account["balance"]
 
-@router.post("/{account_number}/withdraw")
-def withdraw(account_number: int, amount: float):
-    if amount <= 0:
-        raise HTTPException(status_code=400, detail="Withdrawal amount must be positive")
-    
-    conn = get_db_connection()
-    try:
-        # Check if account exists and get current balance
-        account_query = """
-        SELECT a.account_number, a.balance, c.overdraft_amount 
-        FROM account a
-        LEFT JOIN checking_account c ON a.account_number = c.account_number
-        WHERE a.account_number = %s
+    lines = [
+        {column: row[column] for column in ("payment_number", "payment_date", "payment_amount", "loan_number")}
+        for row in rows if row["payment_number"] is not None
+    ]
+    return {
+        **page_of(lines, limit, "payment_number"),
+        "account_number": account_number,
+        "balance": balance,
+        "from_date": from_date,
+        "to_date": to_date,
+        "payment_count": rows[0]["payment_count"],
+        "total_paid": rows[0]["total_paid"],
+    }
+
+@router.get("/{account_number}/balance", response_model=AccountBalance)
+async def get_account_balance(
+    account_number: int,
+    as_of: Optional[datetime] = Query(None, description="Balance at this moment; defaults to now")
+):
+    # Nearest checkpoint plus a bounded journal scan, on the account's shard
+    async with borrow_shard(account_number) as conn:
+        balance = await balance_as_of(conn, account_number, as_of)
+    if not balance:
+        raise HTTPException(status_code=404, detail="No balance history for this account at that time")
+    return {"account_number": account_number, **balance}
+
+@router.post("/{account_number}/deposit")
+async def deposit(
+    account_number: int,
+    amount: float,
+    idempotency_key: Optional[str] = Header(None, max_length=idempotency.IDEMPOTENCY_KEY_MAX_LENGTH)
+):
+    deposit_amount = _cents(amount, "Deposit")
+    
+    # Opt-in group commit; a request with an Idempotency-Key keeps its own transaction for its claim
+    if deposit_batcher and idempotency_key is None:
+        balance = await deposit_batcher.deposit(account_number, deposit_amount)
+        return {"message": f"Deposited {amount}. New balance: {balance}"}
+    
+    # A retry this worker already answered is replayed without a connection
+    digest = idempotency.fingerprint(account_number, amount)
+    replay = await idempotency.lookup("deposit", idempotency_key, digest)
+    if replay:
+        return replay
+    
+    async with borrow_shard(account_number, write=True) as conn, transaction(conn):
+        # Only the first request with this key goes on to change the balance
+        replay = await idempotency.claim(conn, "deposit", idempotency_key, digest)
+        if replay:
+            return replay
+        
+        # Apply the deposit in place so concurrent requests cannot overwrite each other
+        update_query = """
+        UPDATE account SET balance = balance + %s, journal_entries = journal_entries + 1
+        WHERE account_number = %s
         """
-        account = execute_read_single_query(conn, account_query, (account_number,))
-        if not account:
+        updated = await execute_update_query(conn, update_query, (deposit_amount, account_number))
+        if not updated:
             raise HTTPException(status_code=404, detail="Account not found")
         
-        # Check if sufficient funds (including overdraft for checking accounts)
-        current_balance = account["balance"]
-        overdraft_limit = account.get("overdraft_amount") or Decimal('0')
+        # Read back our own write before committing
+        balance_query = "SELECT balance, journal_entries FROM account WHERE account_number = %s"
+        account = await execute_read_single_query(conn, balance_query, (account_number,))
+        
+        # Journal the change in the same transaction
+        await record_entry(
+            conn, account_number, "deposit", deposit_amount, account["balance"], account["journal_entries"]
+        )
+        
+        response = {"message": f"Deposited {amount}. New balance: {account['balance']}"}
+        saved = await idempotency.save(conn, "deposit", idempotency_key, status.HTTP_200_OK, response)
+    
+    await idempotency.remember("deposit", idempotency_key, digest, saved)
+    return response
+
+@router.post("/{account_number}/withdraw")
+async def withdraw(
+    account_number: int,
+    amount: float,
+    idempotency_key: Optional[str] = Header(None, max_length=idempotency.IDEMPOTENCY_KEY_MAX_LENGTH)
+):
+    withdrawal = _cents(amount, "Withdrawal")
+    
+    # A retry this worker already answered is replayed without a connection
+    digest = idempotency.fingerprint(account_number, amount)
+    replay = await idempotency.lookup("withdraw", idempotency_key, digest)
+    if replay:
+        return replay
+    
+    # Debit only if the result stays within the overdraft limit (zero for non-checking accounts)
+    update_query = """
+    UPDATE account a
+    LEFT JOIN checking_account c ON a.account_number = c.account_number
+    SET a.balance = a.balance - %s, a.journal_entries = a.journal_entries + 1
+    WHERE a.account_number = %s AND a.balance - %s >= -COALESCE(c.overdraft_amount, 0)
+    """
+    async with borrow_shard(account_number, write=True) as conn, transaction(conn):
+        # Only the first request with this key goes on to change the balance;
+        # a refused withdrawal rolls its claim back, so it can be retried
+        replay = await idempotency.claim(conn, "withdraw", idempotency_key, digest)
+        if replay:
+            return replay
         
-        if current_balance - Decimal(str(amount)) < -overdraft_limit:
+        updated = await execute_update_query(conn, update_query, (withdrawal, account_number, withdrawal))
+        if not updated:
+            # Nothing changed: either the account is missing or funds are insufficient
+            exists_query = "SELECT 1 FROM account WHERE account_number = %s"
+            if not await execute_read_single_query(conn, exists_query, (account_number,)):
+                raise HTTPException(status_code=404, detail="Account not found")
             raise HTTPException(status_code=400, detail="Insufficient funds")
         
-        # Update balance
-        new_balance = current_balance - Decimal(str(amount))
-        update_query = "UPDATE account SET balance = %s WHERE account_number = %s"
-        execute_write_query(conn, update_query, (new_balance, account_number))
+        # Read back our own write before committing
+        balance_query = "SELECT balance, journal_entries FROM account WHERE account_number = %s"
+        account = await execute_read_single_query(conn, balance_query, (account_number,))
+        
+        # Journal the change in the same transaction
+        await record_entry(
+            conn, account_number, "withdrawal", -withdrawal, account["balance"], account["journal_entries"]
+        )
         
-        return {"message": f"Withdrew {amount}. New balance: {new_balance}"}
-    finally:
-        conn.close()
\ No newline at end of file
+        response = {"message": f"Withdrew {amount}. New balance: {account['balance']}"}
+        saved = await idempotency.save(conn, "withdraw", idempotency_key, status.HTTP_200_OK, response)
+    
+    await idempotency.remember("withdraw", idempotency_key, digest, saved)
+    return response
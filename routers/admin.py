@@ -0,0 +1,40 @@
+import asyncio
+from fastapi import APIRouter, HTTPException, status
+from db.interest import INTEREST_CHUNK_SIZE, accrue, progress
+from models.interest import InterestAccrualCreate, InterestAccrualRun
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    responses={404: {"description": "Not found"}}
+)
+
+# Accrual runs started by this process, by run id
+_runs = {}
+
+async def _run_status(run_id):
+    try:
+        summary = await progress(run_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    task = _runs.get(run_id)
+    error = None
+    if task is not None and task.done() and not task.cancelled() and task.exception() is not None:
+        error = str(task.exception())
+    return {**summary, "running": task is not None and not task.done(), "error": error}
+
+@router.post("/interest/accrue", response_model=InterestAccrualRun, status_code=status.HTTP_202_ACCEPTED)
+async def start_interest_accrual(run: InterestAccrualCreate):
+    # One task per run id; posting a finished or failed id again resumes it
+    task = _runs.get(run.run_id)
+    if task is not None and not task.done():
+        raise HTTPException(status_code=409, detail="Accrual run already in progress")
+    _runs[run.run_id] = asyncio.create_task(accrue(run.run_id, run.days, run.chunk_size or INTEREST_CHUNK_SIZE, run.concurrency))
+    return await _run_status(run.run_id)
+
+@router.get("/interest/{run_id}", response_model=InterestAccrualRun)
+async def get_interest_accrual(run_id: str):
+    summary = await _run_status(run_id)
+    if not summary["chunks"] and run_id not in _runs:
+        raise HTTPException(status_code=404, detail="Accrual run not found")
+    return summary
@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Literal, Union
+from db.async_database import get_db, execute_read_query, execute_read_single_query
+from models.branch import BranchSummary, CitySummary
+
+router = APIRouter(
+    prefix="/branches",
+    tags=["branches"],
+    responses={404: {"description": "Not found"}}
+)
+
+# Branch rows with their loan book, maintained incrementally by create_loan and payments
+BRANCH_SUMMARY = """
+SELECT br.branch_name, br.branch_city,
+       COALESCE(s.loan_count, 0) AS loan_count,
+       COALESCE(s.loan_total, 0) AS loan_total,
+       ROUND(s.loan_total / NULLIF(s.loan_count, 0), 2) AS average_loan,
+       COALESCE(s.total_paid, 0) AS total_paid,
+       COALESCE(s.outstanding, 0) AS outstanding
+FROM branch br
+LEFT JOIN branch_loan_summary s ON s.branch_name = br.branch_name
+"""
+
+@router.get("/summary", response_model=Union[List[BranchSummary], List[CitySummary]])
+async def get_branch_summaries(
+    group_by: Literal["branch", "city"] = Query("branch", description="One row per branch or per city"),
+    conn=Depends(get_db)
+):
+    if group_by == "branch":
+        return await execute_read_query(conn, BRANCH_SUMMARY + "ORDER BY br.branch_name")
+
+    # City totals add up the per-branch rows, one per branch rather than one per loan
+    query = """
+    SELECT br.branch_city, COUNT(*) AS branch_count,
+           COALESCE(SUM(s.loan_count), 0) AS loan_count,
+           COALESCE(SUM(s.loan_total), 0) AS loan_total,
+           ROUND(SUM(s.loan_total) / NULLIF(SUM(s.loan_count), 0), 2) AS average_loan,
+           COALESCE(SUM(s.total_paid), 0) AS total_paid,
+           COALESCE(SUM(s.outstanding), 0) AS outstanding
+    FROM branch br
+    LEFT JOIN branch_loan_summary s ON s.branch_name = br.branch_name
+    GROUP BY br.branch_city
+    ORDER BY br.branch_city
+    """
+    return await execute_read_query(conn, query)
+
+@router.get("/{branch_name}/summary", response_model=BranchSummary)
+async def get_branch_summary(branch_name: str, conn=Depends(get_db)):
+    summary = await execute_read_single_query(conn, BRANCH_SUMMARY + "WHERE br.branch_name = %s", (branch_name,))
+    if not summary:
+        raise HTTPException(status_code=404, detail="Branch not found")
+    return summary
@@ -1,7 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
-from db.database import get_db_connection, execute_read_query, execute_read_single_query, execute_write_query
-from models.customer import Customer, CustomerCreate
+import asyncio
+import heapq
+from operator import itemgetter
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
+from typing import List, Optional
+from db.async_database import get_db, borrow_connection, execute_read_query, execute_read_single_query, execute_primary_read_single_query, execute_write_query, execute_many_query, transaction
+from db.ids import allocator
+from db.cache import cache
+from db.shards import router as shard_router, execute_fan_out_query, execute_shard_read_query
+from models.customer import Customer, CustomerCreate, CustomerPortfolio
+from models.pagination import Page, page_of, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from models.bulk import BulkItemResult, MAX_BULK_ITEMS
 
 router = APIRouter(
     prefix="/customers",
@@ -9,102 +17,239 @@ router = APIRouter(
     responses={404: {"description": "Not found"}}
 )
 
-@router.get("/", response_model=List[Customer])
-def get_all_customers():
-    conn = get_db_connection()
-    try:
-        query = "SELECT * FROM customer"
-        customers = execute_read_query(conn, query)
-        return customers
-    finally:
-        conn.close()
+@router.get("/", response_model=Page[Customer])
+async def get_all_customers(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = Query(None, description="Return rows after this customer_id"),
+    conn=Depends(get_db)
+):
+    query = "SELECT * FROM customer WHERE customer_id > %s ORDER BY customer_id LIMIT %s"
+    customers = await execute_read_query(conn, query, (after or 0, limit + 1))
+    return page_of(customers, limit, "customer_id")
+
+# Payments per customer in a portfolio, newest first
+PORTFOLIO_RECENT_PAYMENTS = 10
+MAX_PORTFOLIO_BATCH = 100
+
+async def _load_portfolios(conn, customer_ids):
+    """Portfolios for ``customer_ids`` keyed by id, in a fixed number of queries however much each holds"""
+    placeholders = ", ".join(["%s"] * len(customer_ids))
+    ids = tuple(customer_ids)
+
+    # Accounts live with their depositor rows on the account's shard: one query per shard
+    accounts_query = f"""
+    SELECT d.customer_id, d.access_date, a.account_number, a.balance, s.interest_rate, c.overdraft_amount
+    FROM depositor d
+    JOIN account a ON a.account_number = d.account_number
+    LEFT JOIN savings_account s ON s.account_number = a.account_number
+    LEFT JOIN checking_account c ON c.account_number = a.account_number
+    WHERE d.customer_id IN ({placeholders})
+    ORDER BY a.account_number
+    """
+
+    async def primary():
+        customers = await execute_read_query(conn, f"SELECT * FROM customer WHERE customer_id IN ({placeholders})", ids)
+        if not customers:
+            return customers, [], [], []
+
+        # Shard 0 is the main database, so its accounts are read on this connection too
+        accounts = await execute_read_query(conn, accounts_query, ids)
+
+        loans_query = f"""
+        SELECT bo.customer_id, l.loan_number, l.amount, b.total_paid, b.outstanding, b.last_payment_date, b.payment_count
+        FROM borrower bo
+        JOIN loan l ON l.loan_number = bo.loan_number
+        LEFT JOIN loan_balance b ON b.loan_number = l.loan_number
+        WHERE bo.customer_id IN ({placeholders})
+        ORDER BY bo.customer_id, l.loan_number
+        """
+        loans = await execute_read_query(conn, loans_query, ids)
+
+        payments_query = f"""
+        SELECT customer_id, payment_number, payment_date, payment_amount, loan_number, account_number
+        FROM (
+            SELECT bo.customer_id, p.payment_number, p.payment_date, p.payment_amount, lp.loan_number, lp.account_number,
+                   ROW_NUMBER() OVER (PARTITION BY bo.customer_id ORDER BY p.payment_date DESC, p.payment_number DESC) AS position
+            FROM borrower bo
+            JOIN loan_payment lp ON lp.loan_number = bo.loan_number
+            JOIN payment p ON p.payment_number = lp.payment_number
+            WHERE bo.customer_id IN ({placeholders})
+        ) recent
+        WHERE position <= %s
+        ORDER BY customer_id, position
+        """
+        payments = await execute_read_query(conn, payments_query, ids + (PORTFOLIO_RECENT_PAYMENTS,))
+        return customers, accounts, loans, payments
+
+    # The other shards are read on their own connections alongside the main database
+    (customers, accounts, loans, payments), *shard_accounts = await asyncio.gather(
+        primary(),
+        *[execute_shard_read_query(shard, accounts_query, ids) for shard in range(1, len(shard_router))]
+    )
+    accounts = list(heapq.merge(accounts, *shard_accounts, key=itemgetter("account_number")))
+
+    portfolios = {
+        customer["customer_id"]: {**customer, "accounts": [], "loans": [], "recent_payments": []}
+        for customer in customers
+    }
+    for account in accounts:
+        if account["customer_id"] in portfolios:
+            account["account_type"] = (
+                "savings" if account["interest_rate"] is not None
+                else "checking" if account["overdraft_amount"] is not None
+                else None
+            )
+            portfolios[account["customer_id"]]["accounts"].append(account)
+    for loan in loans:
+        portfolios[loan["customer_id"]]["loans"].append(loan)
+    for payment in payments:
+        portfolios[payment["customer_id"]]["recent_payments"].append(payment)
+    return portfolios
+
+@router.get("/portfolio", response_model=List[CustomerPortfolio])
+async def get_portfolios(
+    customer_id: List[int] = Query(..., max_length=MAX_PORTFOLIO_BATCH, description="Repeat for each customer"),
+    conn=Depends(get_db)
+):
+    # Same queries as a single portfolio, with every id in each IN list; unknown ids are left out
+    portfolios = await _load_portfolios(conn, sorted(set(customer_id)))
+    return [portfolios[cid] for cid in dict.fromkeys(customer_id) if cid in portfolios]
 
 @router.get("/{customer_id}", response_model=Customer)
-def get_customer(customer_id: int):
-    conn = get_db_connection()
-    try:
-        query = "SELECT * FROM customer WHERE customer_id = %s"
-        customer = execute_read_single_query(conn, query, (customer_id,))
-        if not customer:
-            raise HTTPException(status_code=404, detail="Customer not found")
-        return customer
-    finally:
-        conn.close()
+async def get_customer(customer_id: int):
+    # Serve from cache; only borrow a connection on a miss
+    async def load():
+        async with borrow_connection() as conn:
+            query = "SELECT * FROM customer WHERE customer_id = %s"
+            return await execute_primary_read_single_query(conn, query, (customer_id,))
+    
+    customer = await cache.get_or_load("customer", customer_id, load)
+    if not customer:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    return customer
+
+@router.get("/{customer_id}/portfolio", response_model=CustomerPortfolio)
+async def get_portfolio(customer_id: int, conn=Depends(get_db)):
+    portfolios = await _load_portfolios(conn, [customer_id])
+    if customer_id not in portfolios:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    return portfolios[customer_id]
 
 @router.post("/", response_model=Customer, status_code=status.HTTP_201_CREATED)
-def create_customer(customer: CustomerCreate):
-    conn = get_db_connection()
-    try:
-        # Get next available customer_id
-        query = "SELECT MAX(customer_id) as max_id FROM customer"
-        result = execute_read_single_query(conn, query)
-        next_id = 1 if not result or result["max_id"] is None else result["max_id"] + 1
-        
-        # Insert new customer
-        query = """
-        INSERT INTO customer (customer_id, customer_name, customer_street, customer_city) 
-        VALUES (%s, %s, %s, %s)
-        """
-        execute_write_query(conn, query, (
-            next_id,
-            customer.customer_name,
-            customer.customer_street,
-            customer.customer_city
-        ))
-        
-        return {
-            "customer_id": next_id,
-            "customer_name": customer.customer_name,
-            "customer_street": customer.customer_street,
-            "customer_city": customer.customer_city
+async def create_customer(customer: CustomerCreate, conn=Depends(get_db)):
+    # Reserve next customer_id
+    next_id = await allocator.next_id("customer", conn)
+    
+    # Insert new customer
+    query = """
+    INSERT INTO customer (customer_id, customer_name, customer_street, customer_city) 
+    VALUES (%s, %s, %s, %s)
+    """
+    await execute_write_query(conn, query, (
+        next_id,
+        customer.customer_name,
+        customer.customer_street,
+        customer.customer_city
+    ))
+    
+    created = {
+        "customer_id": next_id,
+        "customer_name": customer.customer_name,
+        "customer_street": customer.customer_street,
+        "customer_city": customer.customer_city
+    }
+    await cache.put("customer", next_id, created)
+    return created
+
+@router.post("/bulk", response_model=List[BulkItemResult[Customer]], status_code=status.HTTP_201_CREATED)
+async def create_customers_bulk(
+    customers: List[CustomerCreate] = Body(..., max_length=MAX_BULK_ITEMS),
+    conn=Depends(get_db)
+):
+    # Reserve all customer_ids up front
+    ids = await allocator.reserve("customer", len(customers), conn) if customers else []
+    rows = [
+        (customer_id, customer.customer_name, customer.customer_street, customer.customer_city)
+        for customer_id, customer in zip(ids, customers)
+    ]
+    
+    # Insert every customer in one multi-row statement and one commit
+    query = """
+    INSERT INTO customer (customer_id, customer_name, customer_street, customer_city) 
+    VALUES (%s, %s, %s, %s)
+    """
+    if rows:
+        async with transaction(conn):
+            await execute_many_query(conn, query, rows)
+    
+    return [
+        {
+            "index": index,
+            "status": "created",
+            "item": {"customer_id": customer_id, **customer.model_dump()}
         }
-    finally:
-        conn.close()
+        for index, (customer_id, customer) in enumerate(zip(ids, customers))
+    ]
 
 @router.put("/{customer_id}", response_model=Customer)
-def update_customer(customer_id: int, customer: CustomerCreate):
-    conn = get_db_connection()
-    try:
-        # Check if customer exists
-        check_query = "SELECT * FROM customer WHERE customer_id = %s"
-        existing = execute_read_single_query(conn, check_query, (customer_id,))
-        if not existing:
-            raise HTTPException(status_code=404, detail="Customer not found")
-        
-        # Update customer
-        query = """
-        UPDATE customer 
-        SET customer_name = %s, customer_street = %s, customer_city = %s 
-        WHERE customer_id = %s
-        """
-        execute_write_query(conn, query, (
-            customer.customer_name,
-            customer.customer_street,
-            customer.customer_city,
-            customer_id
-        ))
-        
-        return {
-            "customer_id": customer_id,
-            "customer_name": customer.customer_name,
-            "customer_street": customer.customer_street,
-            "customer_city": customer.customer_city
-        }
-    finally:
-        conn.close()
+async def update_customer(customer_id: int, customer: CustomerCreate, conn=Depends(get_db)):
+    # Check if customer exists
+    check_query = "SELECT * FROM customer WHERE customer_id = %s"
+    existing = await execute_read_single_query(conn, check_query, (customer_id,))
+    if not existing:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    
+    # Update customer
+    query = """
+    UPDATE customer 
+    SET customer_name = %s, customer_street = %s, customer_city = %s 
+    WHERE customer_id = %s
+    """
+    await execute_write_query(conn, query, (
+        customer.customer_name,
+        customer.customer_street,
+        customer.customer_city,
+        customer_id
+    ))
+    await cache.invalidate("customer", customer_id)
+    
+    return {
+        "customer_id": customer_id,
+        "customer_name": customer.customer_name,
+        "customer_street": customer.customer_street,
+        "customer_city": customer.customer_city
+    }
 
 @router.delete("/{customer_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_customer(customer_id: int):
-    conn = get_db_connection()
+async def delete_customer(customer_id: int, conn=Depends(get_db)):
+    # Check if customer exists
+    check_query = "SELECT * FROM customer WHERE customer_id = %s"
+    existing = await execute_read_single_query(conn, check_query, (customer_id,))
+    if not existing:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    
+    # Depositor rows on the other shards have no foreign key to customer, so check every shard
+    depositor_query = "SELECT account_number FROM depositor WHERE customer_id = %s LIMIT 1"
+    if await execute_fan_out_query(depositor_query, (customer_id,), connection=conn):
+        raise HTTPException(status_code=409, detail="Customer still holds accounts")
+    
+    # Loans and bankers live on the main database; check the primary, not a replica that may lag
+    references_query = """
+    SELECT EXISTS(SELECT 1 FROM borrower WHERE customer_id = %s) AS borrows,
+           EXISTS(SELECT 1 FROM cust_banker WHERE customer_id = %s) AS banked
+    """
+    references = await execute_primary_read_single_query(conn, references_query, (customer_id, customer_id))
+    if references["borrows"]:
+        raise HTTPException(status_code=409, detail="Customer is still a borrower on a loan")
+    if references["banked"]:
+        raise HTTPException(status_code=409, detail="Customer still has an assigned banker")
+    
+    # Delete customer; a reference added since the checks still fails its foreign key
+    query = "DELETE FROM customer WHERE customer_id = %s"
     try:
-        # Check if customer exists
-        check_query = "SELECT * FROM customer WHERE customer_id = %s"
-        existing = execute_read_single_query(conn, check_query, (customer_id,))
-        if not existing:
-            raise HTTPException(status_code=404, detail="Customer not found")
-        
-        # Delete customer
-        query = "DELETE FROM customer WHERE customer_id = %s"
-        execute_write_query(conn, query, (customer_id,))
-    finally:
-        conn.close()
\ No newline at end of file
+        await execute_write_query(conn, query, (customer_id,))
+    except HTTPException as e:
+        if "foreign key constraint fails" in str(e.detail):
+            raise HTTPException(status_code=409, detail="Customer is still referenced")
+        raise
+    await cache.invalidate("customer", customer_id)
\ No newline at end of file
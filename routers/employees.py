@@ -1,7 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
-from db.database import get_db_connection, execute_read_query, execute_read_single_query, execute_write_query
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
+from typing import List, Optional
+from db.async_database import get_db, borrow_connection, execute_read_query, execute_read_single_query, execute_primary_read_single_query, execute_write_query, execute_many_query, transaction
+from db.ids import allocator
+from db.cache import cache
 from models.employee import Employee, EmployeeCreate
+from models.pagination import Page, page_of, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from models.bulk import BulkItemResult, MAX_BULK_ITEMS
 
 router = APIRouter(
     prefix="/employees",
@@ -9,110 +13,138 @@ router = APIRouter(
     responses={404: {"description": "Not found"}}
 )
 
-@router.get("/", response_model=List[Employee])
-def get_all_employees():
-    conn = get_db_connection()
-    try:
-        query = "SELECT * FROM employee"
-        employees = execute_read_query(conn, query)
-        return employees
-    finally:
-        conn.close()
+@router.get("/", response_model=Page[Employee])
+async def get_all_employees(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = Query(None, description="Return rows after this employee_id"),
+    conn=Depends(get_db)
+):
+    query = "SELECT * FROM employee WHERE employee_id > %s ORDER BY employee_id LIMIT %s"
+    employees = await execute_read_query(conn, query, (after or 0, limit + 1))
+    return page_of(employees, limit, "employee_id")
 
 @router.get("/{employee_id}", response_model=Employee)
-def get_employee(employee_id: int):
-    conn = get_db_connection()
-    try:
-        query = "SELECT * FROM employee WHERE employee_id = %s"
-        employee = execute_read_single_query(conn, query, (employee_id,))
-        if not employee:
-            raise HTTPException(status_code=404, detail="Employee not found")
-        return employee
-    finally:
-        conn.close()
+async def get_employee(employee_id: int):
+    # Serve from cache; only borrow a connection on a miss
+    async def load():
+        async with borrow_connection() as conn:
+            query = "SELECT * FROM employee WHERE employee_id = %s"
+            return await execute_primary_read_single_query(conn, query, (employee_id,))
+    
+    employee = await cache.get_or_load("employee", employee_id, load)
+    if not employee:
+        raise HTTPException(status_code=404, detail="Employee not found")
+    return employee
 
 @router.post("/", response_model=Employee, status_code=status.HTTP_201_CREATED)
-def create_employee(employee: EmployeeCreate):
-    conn = get_db_connection()
-    try:
-        # Get next available employee_id
-        query = "SELECT MAX(employee_id) as max_id FROM employee"
-        result = execute_read_single_query(conn, query)
-        next_id = 101 if not result or result["max_id"] is None else result["max_id"] + 1
-        
-        # Insert new employee
-        query = """
-        INSERT INTO employee (employee_id, employee_name, telephone_number, dependent_name, start_date, employment_length)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        """
-        execute_write_query(conn, query, (
-            next_id,
+async def create_employee(employee: EmployeeCreate, conn=Depends(get_db)):
+    # Reserve next employee_id
+    next_id = await allocator.next_id("employee", conn)
+    
+    # Insert new employee
+    query = """
+    INSERT INTO employee (employee_id, employee_name, telephone_number, dependent_name, start_date, employment_length)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    """
+    await execute_write_query(conn, query, (
+        next_id,
+        employee.employee_name,
+        employee.telephone_number,
+        employee.dependent_name,
+        employee.start_date,
+        employee.employment_length
+    ))
+    
+    created = {
+        "employee_id": next_id,
+        "employee_name": employee.employee_name,
+        "telephone_number": employee.telephone_number,
+        "dependent_name": employee.dependent_name,
+        "start_date": employee.start_date,
+        "employment_length": employee.employment_length
+    }
+    await cache.put("employee", next_id, created)
+    return created
+
+@router.post("/bulk", response_model=List[BulkItemResult[Employee]], status_code=status.HTTP_201_CREATED)
+async def create_employees_bulk(
+    employees: List[EmployeeCreate] = Body(..., max_length=MAX_BULK_ITEMS),
+    conn=Depends(get_db)
+):
+    # Reserve all employee_ids up front
+    ids = await allocator.reserve("employee", len(employees), conn) if employees else []
+    rows = [
+        (
+            employee_id,
             employee.employee_name,
             employee.telephone_number,
             employee.dependent_name,
             employee.start_date,
             employee.employment_length
-        ))
-        
-        return {
-            "employee_id": next_id,
-            "employee_name": employee.employee_name,
-            "telephone_number": employee.telephone_number,
-            "dependent_name": employee.dependent_name,
-            "start_date": employee.start_date,
-            "employment_length": employee.employment_length
+        )
+        for employee_id, employee in zip(ids, employees)
+    ]
+    
+    # Insert every employee in one multi-row statement and one commit
+    query = """
+    INSERT INTO employee (employee_id, employee_name, telephone_number, dependent_name, start_date, employment_length)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    """
+    if rows:
+        async with transaction(conn):
+            await execute_many_query(conn, query, rows)
+    
+    return [
+        {
+            "index": index,
+            "status": "created",
+            "item": {"employee_id": employee_id, **employee.model_dump()}
         }
-    finally:
-        conn.close()
+        for index, (employee_id, employee) in enumerate(zip(ids, employees))
+    ]
 
 @router.put("/{employee_id}", response_model=Employee)
-def update_employee(employee_id: int, employee: EmployeeCreate):
-    conn = get_db_connection()
-    try:
-        # Check if employee exists
-        check_query = "SELECT * FROM employee WHERE employee_id = %s"
-        existing = execute_read_single_query(conn, check_query, (employee_id,))
-        if not existing:
-            raise HTTPException(status_code=404, detail="Employee not found")
-        
-        # Update employee
-        query = """
-        UPDATE employee 
-        SET employee_name = %s, telephone_number = %s, dependent_name = %s, start_date = %s, employment_length = %s
-        WHERE employee_id = %s
-        """
-        execute_write_query(conn, query, (
-            employee.employee_name,
-            employee.telephone_number,
-            employee.dependent_name,
-            employee.start_date,
-            employee.employment_length,
-            employee_id
-        ))
-        
-        return {
-            "employee_id": employee_id,
-            "employee_name": employee.employee_name,
-            "telephone_number": employee.telephone_number,
-            "dependent_name": employee.dependent_name,
-            "start_date": employee.start_date,
-            "employment_length": employee.employment_length
-        }
-    finally:
-        conn.close()
+async def update_employee(employee_id: int, employee: EmployeeCreate, conn=Depends(get_db)):
+    # Check if employee exists
+    check_query = "SELECT * FROM employee WHERE employee_id = %s"
+    existing = await execute_read_single_query(conn, check_query, (employee_id,))
+    if not existing:
+        raise HTTPException(status_code=404, detail="Employee not found")
+    
+    # Update employee
+    query = """
+    UPDATE employee 
+    SET employee_name = %s, telephone_number = %s, dependent_name = %s, start_date = %s, employment_length = %s
+    WHERE employee_id = %s
+    """
+    await execute_write_query(conn, query, (
+        employee.employee_name,
+        employee.telephone_number,
+        employee.dependent_name,
+        employee.start_date,
+        employee.employment_length,
+        employee_id
+    ))
+    await cache.invalidate("employee", employee_id)
+    
+    return {
+        "employee_id": employee_id,
+        "employee_name": employee.employee_name,
+        "telephone_number": employee.telephone_number,
+        "dependent_name": employee.dependent_name,
+        "start_date": employee.start_date,
+        "employment_length": employee.employment_length
+    }
 
 @router.delete("/{employee_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_employee(employee_id: int):
-    conn = get_db_connection()
-    try:
-        # Check if employee exists
-        check_query = "SELECT * FROM employee WHERE employee_id = %s"
-        existing = execute_read_single_query(conn, check_query, (employee_id,))
-        if not existing:
-            raise HTTPException(status_code=404, detail="Employee not found")
-        
-        # Delete employee
-        query = "DELETE FROM employee WHERE employee_id = %s"
-        execute_write_query(conn, query, (employee_id,))
-    finally:
-        conn.close()
\ No newline at end of file
+async def delete_employee(employee_id: int, conn=Depends(get_db)):
+    # Check if employee exists
+    check_query = "SELECT * FROM employee WHERE employee_id = %s"
+    existing = await execute_read_single_query(conn, check_query, (employee_id,))
+    if not existing:
+        raise HTTPException(status_code=404, detail="Employee not found")
+    
+    # Delete employee
+    query = "DELETE FROM employee WHERE employee_id = %s"
+    await execute_write_query(conn, query, (employee_id,))
+    await cache.invalidate("employee", employee_id)
\ No newline at end of file
@@ -1,7 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
-from db.database import get_db_connection, execute_read_query, execute_read_single_query, execute_write_query
-from models.loan import Loan, LoanCreate, Borrower, BorrowerCreate
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import Literal, Optional
+from decimal import Decimal
+from db.async_database import get_db, borrow_connection, execute_read_query, execute_read_single_query, execute_primary_read_single_query, execute_write_query, transaction
+from db.ids import allocator
+from db.cache import cache
+from db.export import export_response
+from db import branch_summary
+from db.loan_balance import open_loan
+from models.loan import Loan, LoanCreate, LoanWithBalance, Borrower, BorrowerCreate
+from models.pagination import Page, page_of, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 router = APIRouter(
     prefix="/loans",
@@ -9,77 +16,100 @@ router = APIRouter(
     responses={404: {"description": "Not found"}}
 )
 
-@router.get("/", response_model=List[Loan])
-def get_all_loans():
-    conn = get_db_connection()
-    try:
-        query = "SELECT * FROM loan"
-        loans = execute_read_query(conn, query)
-        return loans
-    finally:
-        conn.close()
+# Loans with their running totals from loan_balance
+LOAN_WITH_BALANCE = """
+SELECT l.loan_number, l.amount, b.total_paid, b.outstanding, b.last_payment_date, b.payment_count
+FROM loan l
+LEFT JOIN loan_balance b ON b.loan_number = l.loan_number
+"""
 
-@router.get("/{loan_number}", response_model=Loan)
-def get_loan(loan_number: int):
-    conn = get_db_connection()
-    try:
-        query = "SELECT * FROM loan WHERE loan_number = %s"
-        loan = execute_read_single_query(conn, query, (loan_number,))
-        if not loan:
-            raise HTTPException(status_code=404, detail="Loan not found")
-        return loan
-    finally:
-        conn.close()
+@router.get("/", response_model=Page[LoanWithBalance])
+async def get_all_loans(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = Query(None, description="Return rows after this loan_number"),
+    outstanding_gt: Optional[Decimal] = Query(None, description="Only loans with more than this still owed"),
+    conn=Depends(get_db)
+):
+    if outstanding_gt is None:
+        query = LOAN_WITH_BALANCE + "WHERE l.loan_number > %s ORDER BY l.loan_number LIMIT %s"
+        params = (after or 0, limit + 1)
+    else:
+        query = LOAN_WITH_BALANCE + "WHERE l.loan_number > %s AND b.outstanding > %s ORDER BY l.loan_number LIMIT %s"
+        params = (after or 0, outstanding_gt, limit + 1)
+    loans = await execute_read_query(conn, query, params)
+    return page_of(loans, limit, "loan_number")
+
+@router.get("/export")
+async def export_loan_payments(fmt: Literal["ndjson", "csv"] = Query("ndjson", alias="format")):
+    query = "SELECT * FROM loan_payment ORDER BY loan_number, account_number, payment_number"
+    return await export_response(query, "loan_payments", fmt)
+
+@router.get("/{loan_number}", response_model=LoanWithBalance)
+async def get_loan(loan_number: int):
+    # Serve from cache; only borrow a connection on a miss. Payments invalidate the entry
+    async def load():
+        async with borrow_connection() as conn:
+            query = LOAN_WITH_BALANCE + "WHERE l.loan_number = %s"
+            return await execute_primary_read_single_query(conn, query, (loan_number,))
+    
+    loan = await cache.get_or_load("loan", loan_number, load)
+    if not loan:
+        raise HTTPException(status_code=404, detail="Loan not found")
+    return loan
 
 @router.post("/", response_model=Loan, status_code=status.HTTP_201_CREATED)
-def create_loan(loan: LoanCreate):
-    conn = get_db_connection()
-    try:
-        # Verify branch exists
-        branch_query = "SELECT * FROM branch WHERE branch_name = %s"
-        branch = execute_read_single_query(conn, branch_query, (loan.branch_name,))
-        if not branch:
-            raise HTTPException(status_code=404, detail="Branch not found")
-        
-        # Get next available loan_number
-        query = "SELECT MAX(loan_number) as max_id FROM loan"
-        result = execute_read_single_query(conn, query)
-        next_id = 5001 if not result or result["max_id"] is None else result["max_id"] + 1
-        
+async def create_loan(loan: LoanCreate, conn=Depends(get_db)):
+    # Verify branch exists
+    branch_query = "SELECT * FROM branch WHERE branch_name = %s"
+    branch = await execute_read_single_query(conn, branch_query, (loan.branch_name,))
+    if not branch:
+        raise HTTPException(status_code=404, detail="Branch not found")
+    
+    # Reserve next loan_number
+    next_id = await allocator.next_id("loan", conn)
+    
+    async with transaction(conn):
         # Create loan
         loan_query = "INSERT INTO loan (loan_number, amount) VALUES (%s, %s)"
-        execute_write_query(conn, loan_query, (next_id, loan.amount))
-        
+        await execute_write_query(conn, loan_query, (next_id, loan.amount))
+    
         # Link loan to branch
         loan_branch_query = "INSERT INTO loan_branch (branch_name, loan_number) VALUES (%s, %s)"
-        execute_write_query(conn, loan_branch_query, (loan.branch_name, next_id))
-        
-        return {
-            "loan_number": next_id,
-            "amount": loan.amount
-        }
-    finally:
-        conn.close()
+        await execute_write_query(conn, loan_branch_query, (loan.branch_name, next_id))
+    
+        # Start its running totals and add it to the branch's loan book
+        await open_loan(conn, next_id, loan.amount)
+        await branch_summary.add_loan(conn, loan.branch_name, loan.amount)
+    
+    created = {
+        "loan_number": next_id,
+        "amount": loan.amount,
+        "total_paid": Decimal("0"),
+        "outstanding": loan.amount,
+        "last_payment_date": None,
+        "payment_count": 0
+    }
+    await cache.put("loan", next_id, created)
+    return created
 
 @router.post("/borrower", response_model=Borrower, status_code=status.HTTP_201_CREATED)
-def add_borrower(borrower: BorrowerCreate):
-    conn = get_db_connection()
+async def add_borrower(borrower: BorrowerCreate, conn=Depends(get_db)):
     try:
         # Verify customer exists
         customer_query = "SELECT * FROM customer WHERE customer_id = %s"
-        customer = execute_read_single_query(conn, customer_query, (borrower.customer_id,))
+        customer = await execute_read_single_query(conn, customer_query, (borrower.customer_id,))
         if not customer:
             raise HTTPException(status_code=404, detail="Customer not found")
         
         # Verify loan exists
         loan_query = "SELECT * FROM loan WHERE loan_number = %s"
-        loan = execute_read_single_query(conn, loan_query, (borrower.loan_number,))
+        loan = await execute_read_single_query(conn, loan_query, (borrower.loan_number,))
         if not loan:
             raise HTTPException(status_code=404, detail="Loan not found")
         
         # Add borrower
         borrower_query = "INSERT INTO borrower (customer_id, loan_number) VALUES (%s, %s)"
-        execute_write_query(conn, borrower_query, (borrower.customer_id, borrower.loan_number))
+        await execute_write_query(conn, borrower_query, (borrower.customer_id, borrower.loan_number))
         
         return {
             "customer_id": borrower.customer_id,
@@ -88,6 +118,4 @@ def add_borrower(borrower: BorrowerCreate):
     except Exception as e:
         if "Duplicate entry" in str(e):
             raise HTTPException(status_code=400, detail="This customer is already a borrower for this loan")
-        raise
-    finally:
-        conn.close()
\ No newline at end of file
+        raise
\ No newline at end of file
@@ -1,7 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
-from db.database import get_db_connection, execute_read_query, execute_read_single_query, execute_write_query
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, status
+from typing import List, Literal, Optional
+from db.async_database import get_db, borrow_connection, execute_read_query, execute_read_single_query, execute_primary_read_single_query, execute_write_query, execute_many_query, transaction
+from db.ids import allocator
+from db.cache import cache
+from db.export import export_response
+from db.shards import existing_accounts
+from db import branch_summary, idempotency, loan_balance
 from models.payment import Payment, PaymentCreate
+from models.pagination import Page, page_of, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from models.bulk import BulkItemResult, MAX_BULK_ITEMS
 
 router = APIRouter(
     prefix="/payments",
@@ -9,68 +16,162 @@ router = APIRouter(
     responses={404: {"description": "Not found"}}
 )
 
-@router.get("/", response_model=List[Payment])
-def get_all_payments():
-    conn = get_db_connection()
-    try:
-        query = "SELECT * FROM payment"
-        payments = execute_read_query(conn, query)
-        return payments
-    finally:
-        conn.close()
+@router.get("/", response_model=Page[Payment])
+async def get_all_payments(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = Query(None, description="Return rows after this payment_number"),
+    conn=Depends(get_db)
+):
+    query = "SELECT * FROM payment WHERE payment_number > %s ORDER BY payment_number LIMIT %s"
+    payments = await execute_read_query(conn, query, (after or 0, limit + 1))
+    return page_of(payments, limit, "payment_number")
+
+@router.get("/export")
+async def export_payments(fmt: Literal["ndjson", "csv"] = Query("ndjson", alias="format")):
+    query = "SELECT * FROM payment ORDER BY payment_number"
+    return await export_response(query, "payments", fmt)
 
 @router.get("/{payment_number}", response_model=Payment)
-def get_payment(payment_number: int):
-    conn = get_db_connection()
-    try:
-        query = "SELECT * FROM payment WHERE payment_number = %s"
-        payment = execute_read_single_query(conn, query, (payment_number,))
-        if not payment:
-            raise HTTPException(status_code=404, detail="Payment not found")
-        return payment
-    finally:
-        conn.close()
+async def get_payment(payment_number: int):
+    # Serve from cache; only borrow a connection on a miss
+    async def load():
+        async with borrow_connection() as conn:
+            query = "SELECT * FROM payment WHERE payment_number = %s"
+            return await execute_primary_read_single_query(conn, query, (payment_number,))
+    
+    payment = await cache.get_or_load("payment", payment_number, load)
+    if not payment:
+        raise HTTPException(status_code=404, detail="Payment not found")
+    return payment
 
 @router.post("/", response_model=Payment, status_code=status.HTTP_201_CREATED)
-def create_payment(payment: PaymentCreate):
-    conn = get_db_connection()
-    try:
-        # Verify loan exists
-        loan_query = "SELECT * FROM loan WHERE loan_number = %s"
-        loan = execute_read_single_query(conn, loan_query, (payment.loan_number,))
-        if not loan:
-            raise HTTPException(status_code=404, detail="Loan not found")
-        
-        # Verify account exists
-        account_query = "SELECT * FROM account WHERE account_number = %s"
-        account = execute_read_single_query(conn, account_query, (payment.account_number,))
-        if not account:
-            raise HTTPException(status_code=404, detail="Account not found")
-        
-        # Get next available payment_number
-        query = "SELECT MAX(payment_number) as max_id FROM payment"
-        result = execute_read_single_query(conn, query)
-        next_id = 7001 if not result or result["max_id"] is None else result["max_id"] + 1
+async def create_payment(
+    payment: PaymentCreate,
+    idempotency_key: Optional[str] = Header(None, max_length=idempotency.IDEMPOTENCY_KEY_MAX_LENGTH),
+    conn=Depends(get_db)
+):
+    # A retry of a completed payment is replayed before any loan or account lookup
+    digest = idempotency.fingerprint(payment)
+    replay = await idempotency.lookup("payment", idempotency_key, digest, conn)
+    if replay:
+        return replay
+    
+    # Verify loan exists
+    loan_query = "SELECT * FROM loan WHERE loan_number = %s"
+    loan = await execute_read_single_query(conn, loan_query, (payment.loan_number,))
+    if not loan:
+        raise HTTPException(status_code=404, detail="Loan not found")
+    
+    # Verify account exists on its shard
+    if not await existing_accounts([payment.account_number], conn):
+        raise HTTPException(status_code=404, detail="Account not found")
+    
+    # Reserve next payment_number
+    next_id = await allocator.next_id("payment", conn)
+    
+    async with transaction(conn):
+        # Only the first request with this key creates the payment
+        replay = await idempotency.claim(conn, "payment", idempotency_key, digest)
+        if replay:
+            return replay
         
         # Create payment
         payment_query = "INSERT INTO payment (payment_number, payment_date, payment_amount) VALUES (%s, %s, %s)"
-        execute_write_query(conn, payment_query, (next_id, payment.payment_date, payment.payment_amount))
-        
+        await execute_write_query(conn, payment_query, (next_id, payment.payment_date, payment.payment_amount))
+    
         # Link payment to loan and account
         loan_payment_query = """
         INSERT INTO loan_payment (loan_number, account_number, payment_number) 
         VALUES (%s, %s, %s)
         """
-        execute_write_query(
+        await execute_write_query(
             conn, 
             loan_payment_query, 
             (payment.loan_number, payment.account_number, next_id)
         )
+    
+        # Keep the loan's and its branch's outstanding amounts current
+        paid = await loan_balance.apply_payments(conn, [payment])
+        await branch_summary.apply_payments(conn, paid)
         
-        return {
+        created = {
             "payment_number": next_id,
             "payment_date": payment.payment_date,
             "payment_amount": payment.payment_amount
         }
-    finally:
-        conn.close()
\ No newline at end of file
+        saved = await idempotency.save(conn, "payment", idempotency_key, status.HTTP_201_CREATED, created)
+    
+    # The cached loan carries its totals
+    await cache.invalidate("loan", payment.loan_number)
+    await idempotency.remember("payment", idempotency_key, digest, saved)
+    await cache.put("payment", next_id, created)
+    return created
+
+@router.post("/bulk", response_model=List[BulkItemResult[Payment]], status_code=status.HTTP_201_CREATED)
+async def create_payments_bulk(
+    payments: List[PaymentCreate] = Body(..., max_length=MAX_BULK_ITEMS),
+    conn=Depends(get_db)
+):
+    if not payments:
+        return []
+    
+    # Verify referenced loans with one query, then accounts
+    loan_numbers = sorted({payment.loan_number for payment in payments})
+    loan_query = f"SELECT loan_number FROM loan WHERE loan_number IN ({', '.join(['%s'] * len(loan_numbers))})"
+    loans = {row["loan_number"] for row in await execute_read_query(conn, loan_query, tuple(loan_numbers))}
+    
+    # Accounts may be spread over shards, so this is one query per shard
+    accounts = await existing_accounts((payment.account_number for payment in payments), conn)
+    
+    results = []
+    valid = []
+    for index, payment in enumerate(payments):
+        if payment.loan_number not in loans:
+            results.append({"index": index, "status": "error", "detail": "Loan not found"})
+        elif payment.account_number not in accounts:
+            results.append({"index": index, "status": "error", "detail": "Account not found"})
+        else:
+            results.append(None)
+            valid.append((index, payment))
+    if not valid:
+        return results
+    
+    # Reserve all payment_numbers up front
+    ids = await allocator.reserve("payment", len(valid), conn)
+    
+    async with transaction(conn):
+        # Create payments
+        payment_query = "INSERT INTO payment (payment_number, payment_date, payment_amount) VALUES (%s, %s, %s)"
+        await execute_many_query(conn, payment_query, [
+            (payment_number, payment.payment_date, payment.payment_amount)
+            for payment_number, (_, payment) in zip(ids, valid)
+        ])
+        
+        # Link payments to loans and accounts
+        loan_payment_query = """
+        INSERT INTO loan_payment (loan_number, account_number, payment_number) 
+        VALUES (%s, %s, %s)
+        """
+        await execute_many_query(conn, loan_payment_query, [
+            (payment.loan_number, payment.account_number, payment_number)
+            for payment_number, (_, payment) in zip(ids, valid)
+        ])
+    
+        # One totals update per loan and per branch rather than per payment
+        paid = await loan_balance.apply_payments(conn, [payment for _, payment in valid])
+        await branch_summary.apply_payments(conn, paid)
+    
+    for loan_number in paid:
+        await cache.invalidate("loan", loan_number)
+    
+    for payment_number, (index, payment) in zip(ids, valid):
+        results[index] = {
+            "index": index,
+            "status": "created",
+            "item": {
+                "payment_number": payment_number,
+                "payment_date": payment.payment_date,
+                "payment_amount": payment.payment_amount
+            }
+        }
+    return results